@@ -0,0 +1,78 @@
+import numpy as np
+from search import l2_normalize
+
+
+# === K-means sphérique (cosinus) en NumPy pur ===
+def spherical_kmeans(X, k, n_iter=20, seed=0, max_train=None, block=8192):
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+    k = max(1, min(k, n))
+    train = X
+    if max_train is not None and n > max_train:
+        train = X[rng.choice(n, max_train, replace=False)]
+    C = train[rng.choice(train.shape[0], k, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = assign_to_centroids(train, C, block)
+        sums = np.zeros_like(C)
+        np.add.at(sums, assign, train)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # cluster vide: réinitialisé sur un point tiré au hasard
+            sums[empty] = train[rng.choice(train.shape[0], int(empty.sum()), replace=False)]
+        C = l2_normalize(sums)
+    return C
+
+
+def assign_to_centroids(X, C, block=8192):
+    out = np.empty(X.shape[0], dtype=np.int64)
+    for start in range(0, X.shape[0], block):
+        out[start:start + block] = np.argmax(X[start:start + block] @ C.T, axis=1)
+    return out
+
+
+# === Index IVF: quantificateur grossier + listes inversées ===
+# On ne parcourt que les nprobe listes dont le centroïde est le plus proche de la requête.
+class IVFIndex:
+    def __init__(self, centroids, list_offsets, list_ids, nprobe=8):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_ids = np.asarray(list_ids, dtype=np.int64)
+        self.nlist = self.centroids.shape[0]
+        self.nprobe = int(nprobe)
+
+    @classmethod
+    def build(cls, X, nlist=None, nprobe=None, n_iter=20, seed=0):
+        Xn = l2_normalize(X)
+        n = Xn.shape[0]
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(n)))
+        if nprobe is None:
+            nprobe = max(1, nlist // 16)
+        C = spherical_kmeans(Xn, nlist, n_iter=n_iter, seed=seed, max_train=256 * nlist)
+        assign = assign_to_centroids(Xn, C)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=C.shape[0])
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(C, offsets, order, nprobe=min(nprobe, C.shape[0]))
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets,
+                 list_ids=self.list_ids, nprobe=np.int64(self.nprobe))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z["centroids"], z["list_offsets"], z["list_ids"], int(z["nprobe"]))
+
+    def candidates(self, q, nprobe=None):
+        # q doit être L2-normalisé
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        cs = self.centroids @ q
+        lists = np.argpartition(-cs, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        o = self.list_offsets
+        return np.concatenate([self.list_ids[o[l]:o[l + 1]] for l in lists])
+
+    def list_sizes(self):
+        return np.diff(self.list_offsets)
@@ -1,12 +1,69 @@
+import asyncio
 import os
-from typing import Optional, Union
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import HTMLResponse
-import joblib
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+from urllib.parse import urlencode
+from typing import List, Optional, Union
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+from pydantic import BaseModel, Field
+import config
+from batching import BatcherPool
+from cache import LRUCache, TTLSizeCache, normalize_query
+from capture import CaptureMiddleware, RequestLog
+import metrics
+from metrics import SlowRequestProfiler, TimingMiddleware, set_film, stage
+from procinfo import format_memory, memory_report
+from registry import ModelRegistry
+
+MODEL_DIR = "models"
+
+# Films découverts dans models/ (manifests <film>_encoder.joblib + <film>_meta.joblib)
+registry = ModelRegistry(MODEL_DIR)
+
+# Valeur de "film" pour chercher dans tous les films à la fois
+ALL_FILMS = "all"
+
+# Couleurs par film (les autres films utilisent le dégradé par défaut)
+THEMES = {
+    "interstellar": ("bg-gradient-to-r from-blue-700 via-purple-700 to-gray-900", "bg-gradient-to-r from-blue-700 to-gray-900"),
+    "fightclub": ("bg-gradient-to-r from-yellow-500 via-red-600 to-gray-800", "bg-gradient-to-r from-yellow-500 to-gray-800"),
+}
+
+# Caches: embeddings de requêtes (model_name, texte) et résultats classés (film, génération, texte, filtres)
+embedding_cache = LRUCache(config.EMBED_CACHE_SIZE)
+result_cache = TTLSizeCache(int(config.RESULT_CACHE_MAX_MB * 1024 * 1024), config.RESULT_CACHE_TTL)
+
+# Micro-batching des encodages concurrents (créé dans la boucle de l'app)
+batchers = None
+
+# Surveillance des pointeurs CURRENT: les nouvelles versions sont chargées en arrière-plan
+async def poll_reload(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(registry.reload)
+        except Exception as e:  # la boucle de surveillance ne doit pas s'arrêter
+            print(f"[!] Rechargement des index: {e}")
+
+# Chargement + warmup de tous les films au démarrage, pas dans la première requête
+@asynccontextmanager
+async def lifespan(app):
+    global batchers
+    registry.preload(warmup=True)
+    print(f"[+] Worker {os.getpid()}: {registry.torch_threads} threads torch, {format_memory(memory_report())}")
+    if config.BATCH_MAX_SIZE > 1:
+        batchers = BatcherPool(asyncio.get_running_loop(), config.BATCH_MAX_SIZE, config.BATCH_MAX_WAIT_MS)
+    poller = asyncio.create_task(poll_reload(config.RELOAD_POLL_S)) if config.RELOAD_POLL_S > 0 else None
+    yield
+    if poller is not None:
+        poller.cancel()
+    if batchers is not None:
+        await batchers.close()
+        batchers = None
 
 # === Création de l'app ===
 app = FastAPI(
@@ -14,43 +71,342 @@ app = FastAPI(
     description="UI + API pour recommander des critiques similaires avec SBERT ✨",
     version="3.6",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
-# Films disponibles
-AVAILABLE = {
-    "interstellar": {"clean_csv": "data/interstellar_clean.csv"},
-    "fightclub": {"clean_csv": "data/fightclub_clean.csv"},
-}
+# Capture des requêtes de recherche pour les rejouer en benchmark (CAPTURE_REQUESTS=chemin.jsonl)
+if config.CAPTURE_REQUESTS:
+    os.makedirs(os.path.dirname(config.CAPTURE_REQUESTS) or ".", exist_ok=True)
+    app.add_middleware(CaptureMiddleware, log=RequestLog(config.CAPTURE_REQUESTS))
 
-MODEL_DIR = "models"
+# Chronométrage par étape (Server-Timing + /metrics), profileur des requêtes lentes si PROFILE_SLOW_MS > 0
+profiler = SlowRequestProfiler(config.PROFILE_SLOW_MS, config.PROFILE_DIR, config.PROFILE_INTERVAL_MS) if config.PROFILE_SLOW_MS > 0 else None
+app.add_middleware(TimingMiddleware, profiler=profiler)
 
 # === Chargement du modèle et données ===
 def ensure_model_loaded(film):
-    if film not in AVAILABLE:
+    try:
+        with stage("load"):
+            m = registry.load(film)
+    except KeyError:
         raise HTTPException(status_code=404, detail=f"Film '{film}' non disponible.")
-    
-    if "encoder" not in AVAILABLE[film]:
-        base = film
-        vec_path = os.path.join(MODEL_DIR, f"{base}_encoder.joblib")
-        X_path = os.path.join(MODEL_DIR, f"{base}_X.npy")
-        meta_path = os.path.join(MODEL_DIR, f"{base}_meta.joblib")
-
-        if not os.path.exists(vec_path) or not os.path.exists(X_path):
-            raise HTTPException(status_code=500, detail=f"Modèle pour '{film}' absent. Lancez build_index.py.")
-        
-        model_name = joblib.load(vec_path)
-        AVAILABLE[film]["encoder"] = SentenceTransformer(model_name)
-        AVAILABLE[film]["X"] = np.load(X_path)
-        AVAILABLE[film]["meta"] = joblib.load(meta_path)
-        df = pd.read_csv(AVAILABLE[film]["clean_csv"], dtype=str).fillna("")
-        AVAILABLE[film]["df"] = df.reset_index(drop=True)
-    
-    return AVAILABLE[film]
-
-def top_sorted(sim_array):
-    idx = np.argsort(-sim_array)
-    return idx, sim_array[idx]
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    set_film(film)  # label des métriques: seulement un film connu (cardinalité bornée)
+    return m
+
+# Index à interroger: celui d'un film, ou l'index global pour film=all
+def search_target(film):
+    if film != ALL_FILMS:
+        return ensure_model_loaded(film)
+    set_film(film)
+    try:
+        with stage("load"):
+            gi = registry.global_index()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"model_name": gi.model_name, "encoder": gi.encoder, "index": gi.index,
+            "attrs": gi.attrs, "global": gi, "generation": gi.generation}
+
+# (film, id local) de chaque résultat: en multi-films les ids sont globaux
+def locate(film, m, ids):
+    if "global" in m:
+        films, local = m["global"].locate(ids)
+        return list(zip(films, local.tolist()))
+    return [(film, int(i)) for i in ids]
+
+def encode_query(m, text):
+    key = (m["model_name"], text)
+    vect = embedding_cache.get(key)
+    if vect is None:
+        with stage("encode"):
+            if batchers is not None:
+                vect = batchers.get(m["model_name"], m["encoder"]).encode_blocking(text)
+            else:
+                vect = m["encoder"].encode([text], convert_to_numpy=True)[0]
+        vect.setflags(write=False)
+        embedding_cache.put(key, vect)
+    return vect
+
+# === Filtres sur les métadonnées (note, date, likes) et mélange avec la popularité ===
+FILTER_KEYS = ("min_rating", "max_rating", "date_from", "date_to", "min_likes")
+
+# Valeurs de formulaire -> filtres actifs (les champs vides sont ignorés)
+def parse_filters(min_rating=None, max_rating=None, date_from=None, date_to=None, min_likes=None, popularity=None):
+    def value(name, raw, cast):
+        if raw is None or str(raw).strip() == "":
+            return None
+        try:
+            return cast(str(raw).strip()) if isinstance(raw, str) else raw
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"Valeur invalide pour {name}: {raw}")
+
+    filters = {
+        "min_rating": value("min_rating", min_rating, float),
+        "max_rating": value("max_rating", max_rating, float),
+        "date_from": value("date_from", date_from, date.fromisoformat),
+        "date_to": value("date_to", date_to, date.fromisoformat),
+        "min_likes": value("min_likes", min_likes, int),
+        "popularity": value("popularity", popularity, float),
+    }
+    if filters["popularity"] is not None and not 0 <= filters["popularity"] <= 1:
+        raise HTTPException(status_code=422, detail="popularity doit être entre 0 et 1.")
+    return {k: v for k, v in filters.items() if v is not None and not (k == "popularity" and v == 0)}
+
+# Masque booléen et poids par document, calculés en NumPy avant le top-k
+def filter_arrays(m, filters):
+    attrs = m["attrs"]
+    mask = attrs.mask(**{k: filters[k] for k in FILTER_KEYS if k in filters})
+    return mask, attrs.weights(filters.get("popularity", 0.0))
+
+# Classement complet d'une requête, partagé par toutes les pages et tous les "limit"
+def ranked_results(film, m, text, filters=None):
+    filters = filters or {}
+    key = (film, m.get("generation"), text, tuple(sorted(filters.items())))
+    ranked = result_cache.get(key)
+    if ranked is None:
+        q = encode_query(m, text)
+        with stage("similarity"):
+            mask, weights = filter_arrays(m, filters)
+            ranked = m["index"].rank(q, mask=mask, weights=weights)
+        result_cache.put(key, ranked)
+    return ranked
+
+# Entrée (version) d'un film pour la requête en cours: celle de l'index interrogé, même si
+# une nouvelle version a été chargée entre-temps (les ids restent cohérents avec les textes)
+def doc_entry(m, film):
+    return m["global"].entries[film] if "global" in m else m
+
+def get_critique(m, film, i):
+    return doc_entry(m, film)["docs"].get(int(i))
+
+# Taille du groupe de doublons d'une critique (1 si l'index n'a pas été dédoublonné)
+def copies_of(m, film, i):
+    copies = doc_entry(m, film)["copies"]
+    return int(copies[i]) if copies is not None else 1
+
+# Note / likes / date d'une critique pour l'affichage (chaîne vide si inconnues)
+def review_label(m, film, i):
+    attrs = doc_entry(m, film)["attrs"]
+    parts = []
+    if not np.isnan(attrs.rating[i]):
+        parts.append(f"★ {attrs.rating[i]:g}/10")
+    if attrs.likes[i] > 0:
+        parts.append(f"{attrs.likes[i]} likes")
+    if not np.isnat(attrs.date[i]):
+        parts.append(attrs.date[i].astype(date).strftime("%d/%m/%Y"))
+    n = copies_of(m, film, i) - 1
+    if n > 0:
+        parts.append(f"{n} copie{'s' if n > 1 else ''} similaire{'s' if n > 1 else ''}")
+    return " · ".join(parts)
+
+# Encodage d'un lot de requêtes: cache d'abord, puis un seul appel au modèle pour les absents
+async def encode_queries(m, texts):
+    vecs = [embedding_cache.get((m["model_name"], t)) for t in texts]
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        todo = [texts[i] for i in missing]
+        if batchers is not None:
+            new = await batchers.get(m["model_name"], m["encoder"]).encode_many(todo)
+        else:
+            new = await run_in_threadpool(m["encoder"].encode, todo, batch_size=len(todo), convert_to_numpy=True)
+        for i, v in zip(missing, new):
+            v.setflags(write=False)
+            embedding_cache.put((m["model_name"], texts[i]), v)
+            vecs[i] = v
+    return np.stack(vecs)
+
+# === Readiness ===
+@app.get("/ready")
+def ready():
+    status = registry.status()
+    status["batching"] = batchers.stats() if batchers is not None else None
+    status["process"] = {"pid": os.getpid(), "torch_threads": registry.torch_threads, "memory": memory_report()}
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# Rechargement immédiat des versions publiées (protégé par ADMIN_TOKEN s'il est défini)
+@app.post("/admin/reload")
+async def admin_reload(x_admin_token: Optional[str] = Header(None)):
+    if config.ADMIN_TOKEN and x_admin_token != config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Jeton d'administration invalide.")
+    swapped = await run_in_threadpool(registry.reload)
+    return {"swapped": swapped, "versions": {f: info["version"] for f, info in registry.status()["films"].items()}}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"embeddings": embedding_cache.stats(), "results": result_cache.stats()}
+
+# === Métriques Prometheus (format texte) ===
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    lines = metrics.STAGE_SECONDS.render() + metrics.REQUEST_SECONDS.render()
+    caches = {"embeddings": embedding_cache.stats(), "results": result_cache.stats()}
+    lines += metrics.sample("critiques_cache_hit_ratio", "Taux de hits des caches",
+                            {(c,): st["hit_ratio"] for c, st in caches.items()}, ("cache",))
+    lines += metrics.sample("critiques_cache_requests_total", "Lectures des caches par résultat",
+                            {(c, r): st[key] for c, st in caches.items() for r, key in (("hit", "hits"), ("miss", "misses"))},
+                            ("cache", "result"), kind="counter")
+    lines += metrics.sample("critiques_cache_entries", "Entrées en cache", {(c,): st["entries"] for c, st in caches.items()}, ("cache",))
+    lines += metrics.sample("critiques_result_cache_bytes", "Mémoire du cache de résultats", {(): caches["results"]["bytes"]})
+    memory = registry.memory()
+    lines += metrics.sample("critiques_index_bytes", "Mémoire des index chargés par film et composant",
+                            {(f, part): b for f, parts in memory.items() for part, b in parts.items()}, ("film", "component"))
+    process = memory_report()
+    if process is not None:
+        lines += metrics.sample("critiques_process_memory_bytes", "Mémoire du worker: unique, partagée avec les autres workers, RSS et PSS",
+                                {(kind,): b for kind, b in process.items()}, ("kind",))
+    if batchers is not None:
+        lines += metrics.sample("critiques_encode_batch_size_mean", "Taille moyenne des lots d'encodage",
+                                {(name,): st["mean_batch_size"] for name, st in batchers.stats().items()}, ("model",))
+    if profiler is not None:
+        lines += metrics.sample("critiques_slow_profiles_total", "Profils de requêtes lentes écrits", {(): profiler.dumped}, kind="counter")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# === API JSON ===
+class SearchRequest(BaseModel):
+    film: str = "interstellar"
+    texts: List[str] = Field(..., min_length=1)
+    top_k: int = Field(10, ge=1, le=1000)
+    offset: int = Field(0, ge=0)
+    min_score: Optional[float] = None
+    include_text: bool = False
+    snippet_chars: int = Field(200, ge=0)
+    # filtres appliqués avant le top-k, et poids de la popularité (likes) dans le score
+    min_rating: Optional[float] = None
+    max_rating: Optional[float] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    min_likes: Optional[int] = Field(None, ge=0)
+    popularity: float = Field(0.0, ge=0, le=1)
+
+class SearchHit(BaseModel):
+    ids: List[int]
+    scores: List[float]
+    films: Optional[List[str]] = None  # film de chaque id (film=all)
+    texts: Optional[List[str]] = None
+    copies: Optional[List[int]] = None  # taille du groupe de doublons de chaque id (index dédoublonné)
+
+class SearchResponse(BaseModel):
+    film: str
+    results: List[SearchHit]
+
+@app.post("/api/search", response_model=SearchResponse, response_model_exclude_none=True)
+async def api_search(req: SearchRequest):
+    if len(req.texts) > config.API_MAX_QUERIES:
+        raise HTTPException(status_code=422, detail=f"Au plus {config.API_MAX_QUERIES} requêtes par appel.")
+    m = search_target(req.film)
+    texts = [normalize_query(t) for t in req.texts]
+    with stage("encode"):
+        Q = await encode_queries(m, texts)
+    k = req.offset + req.top_k
+    filters = parse_filters(req.min_rating, req.max_rating, req.date_from, req.date_to, req.min_likes, req.popularity)
+    with stage("similarity"):
+        mask, weights = filter_arrays(m, filters)
+        idx, scores = await run_in_threadpool(m["index"].search_batch, Q, k, mask, weights)
+
+    results = []
+    for row_idx, row_scores in zip(idx, scores):
+        row_idx = row_idx[req.offset:]
+        row_scores = row_scores[req.offset:]
+        if req.min_score is not None:
+            keep = row_scores >= req.min_score
+            row_idx, row_scores = row_idx[keep], row_scores[keep]
+        hits = locate(req.film, m, row_idx)
+        hit = SearchHit(ids=[i for _, i in hits], scores=np.round(row_scores.astype(np.float64), 6).tolist())
+        if req.film == ALL_FILMS:
+            hit.films = [f for f, _ in hits]
+        if req.include_text:
+            with stage("fetch"):
+                hit.texts = [get_critique(m, f, i)[:req.snippet_chars] for f, i in hits]
+        if any(doc_entry(m, f)["copies"] is not None for f in {f for f, _ in hits}):
+            hit.copies = [copies_of(m, f, i) for f, i in hits]
+        results.append(hit)
+    return SearchResponse(film=req.film, results=results)
+
+# === Critiques similaires (graphe kNN précalculé) ===
+SIMILAR_K = 20  # voisins affichés quand l'index n'a pas de graphe
+
+# Voisins d'une critique: lecture du graphe en O(K); sans graphe, parcours de l'index à partir
+# de l'embedding stocké. Dans les deux cas, aucun appel au modèle. mask (filtres de métadonnées)
+# s'applique à toute la ligne du graphe avant la troncature à k; si la ligne n'a pas k voisins
+# (autorisés), l'index est parcouru avec le masque.
+def similar_ids(film, m, doc_id, k=None, mask=None):
+    if not 0 <= doc_id < m["X"].shape[0]:
+        raise HTTPException(status_code=404, detail=f"Critique {doc_id} introuvable pour '{film}'.")
+    with stage("similarity"):
+        if m["knn"] is not None:
+            ids, scores = m["knn"].neighbours(doc_id)
+            want = k or m["knn"].k
+            if mask is not None:
+                keep = mask[ids]
+                ids, scores = ids[keep], scores[keep]
+            if ids.shape[0] >= want:
+                return ids[:want], scores[:want], "graph"
+        k = k or SIMILAR_K
+        q = np.asarray(m["X"][doc_id])
+        if mask is None:
+            ids, scores = m["index"].search(q, k + 1)
+            keep = ids != doc_id
+            return ids[keep][:k], scores[keep][:k], "scan"
+        mask = mask.copy()
+        mask[doc_id] = False  # pas la critique elle-même
+        ids, scores = m["index"].search(q, k, mask=mask)
+        return ids, scores, "scan"
+
+class SimilarResponse(BaseModel):
+    film: str
+    id: int
+    source: str  # "graph" (précalculé) ou "scan" (index sans graphe)
+    ids: List[int]
+    scores: List[float]
+    texts: Optional[List[str]] = None
+
+@app.get("/similar/{film}/{doc_id}", response_model=SimilarResponse, response_model_exclude_none=True)
+def similar(film: str, doc_id: int, k: int = Query(10, ge=1, le=1000), include_text: bool = False,
+            snippet_chars: int = Query(200, ge=0)):
+    m = ensure_model_loaded(film)
+    ids, scores, source = similar_ids(film, m, doc_id, k)
+    res = SimilarResponse(film=film, id=doc_id, source=source, ids=ids.tolist(),
+                          scores=np.round(scores.astype(np.float64), 4).tolist())
+    if include_text:
+        with stage("fetch"):
+            res.texts = [get_critique(m, film, i)[:snippet_chars] for i in ids]
+    return res
+
+# Carte d'un résultat (recherche par texte ou critiques similaires)
+def result_card(film, i, s, critique_text, review_info, id_label):
+    sim_percent = f"{s * 100:.1f}%"
+    short_text = critique_text[:200] + ("..." if len(critique_text) > 200 else "")
+
+    # Déterminer la couleur en fonction du score de similarité
+    if s >= 0.8:
+        score_color = "text-green-600"
+    elif s >= 0.6:
+        score_color = "text-yellow-600"
+    elif s >= 0.4:
+        score_color = "text-orange-600"
+    else:
+        score_color = "text-red-600"
+
+    return f"""
+    <div class="bg-white rounded-xl shadow-md p-6 mb-4 hover:shadow-lg transition-shadow duration-300 result-item">
+        <div class="flex justify-between items-start mb-3">
+            <span class="text-sm text-gray-500">{id_label}{" · " + review_info if review_info else ""}</span>
+            <span class="text-lg font-semibold {score_color}">Similarité de {sim_percent}</span>
+        </div>
+        <div class="text-gray-800 critique-cell break-words overflow-wrap-anywhere">
+            <p class="short-text">{short_text}</p>
+            <p class="full-text hidden mt-2">{critique_text}</p>
+            {"<button class='toggle-btn mt-2 text-blue-500 hover:text-blue-700 font-medium text-sm transition-colors duration-200'>Voir plus →</button>" if len(critique_text) > 200 else ""}
+        </div>
+        <div class="mt-3 text-right">
+            <a href="/?film={film}&similar_to={i}" class="text-sm text-purple-600 hover:text-purple-800 font-medium transition-colors duration-200">
+                <i class="fas fa-project-diagram mr-1"></i> Critiques similaires
+            </a>
+        </div>
+    </div>
+    """
 
 # === UI principale ===
 @app.get("/", response_class=HTMLResponse)
@@ -59,7 +415,14 @@ def home(
     text: str = Query(""),
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=50),
-    limit: Optional[Union[int, str]] = Query(None)
+    limit: Optional[Union[int, str]] = Query(None),
+    min_rating: Optional[str] = Query(None),
+    max_rating: Optional[str] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    min_likes: Optional[str] = Query(None),
+    popularity: Optional[str] = Query(None),
+    similar_to: Optional[int] = Query(None)
 ):
     results_html = ""
     pagination_html = ""
@@ -76,58 +439,62 @@ def home(
             except ValueError:
                 limit = None
 
-    if text.strip() != "":
-        # Charger modèle + données
+    # Filtres de métadonnées, conservés d'une page à l'autre
+    filters = parse_filters(min_rating, max_rating, date_from, date_to, min_likes, popularity)
+    filter_params = {k: (v.isoformat() if isinstance(v, date) else f"{v:g}" if isinstance(v, float) else v) for k, v in filters.items()}
+    filter_hidden = "".join(f'<input type="hidden" name="{k}" value="{v}">' for k, v in filter_params.items())
+    filter_qs = "&" + urlencode(filter_params) if filter_params else ""
+
+    show_results = text.strip() != "" or similar_to is not None
+    results_title = "Résultats"
+
+    if similar_to is not None:
+        # Critiques proches d'une critique donnée: voisins précalculés, pas d'encodage
         m = ensure_model_loaded(film)
-        vect = m["encoder"].encode([text], convert_to_numpy=True)
-        X = m["X"]
-        sims = cosine_similarity(vect, X).flatten()
+        mask, _ = filter_arrays(m, filters)
+        ids, scores, _ = similar_ids(film, m, similar_to, per_page, mask)
+        with stage("fetch"):
+            source_text = get_critique(m, film, similar_to)
+            page_hits = [(i, s, get_critique(m, film, i), review_label(m, film, i)) for i, s in zip(ids, scores)]
+        t_render = time.perf_counter()
+        total_results = len(page_hits)
+        results_title = f"Critiques proches de la critique #{similar_to} ({registry.titles().get(film, film)})"
+        results_html += f"""
+        <div class="bg-purple-50 rounded-xl p-4 mb-6 text-gray-700 italic break-words">
+            « {source_text[:300]}{"..." if len(source_text) > 300 else ""} »
+        </div>
+        """
+        for i, s, critique_text, review_info in page_hits:
+            results_html += result_card(film, i, s, critique_text, review_info, f"ID: {i}")
+
+    elif text.strip() != "":
+        # Charger modèle + données (un film, ou l'index global)
+        m = search_target(film)
 
-        # Trier tous les résultats
-        idxs, scores = top_sorted(sims)
-        df = m["df"]
-        total_results = len(idxs)
+        # Classement partiel (seul le préfixe affiché est trié), mis en cache pour la pagination
+        ranked = ranked_results(film, m, normalize_query(text), filters)
+        total_results = ranked.n
 
         # Appliquer filtre (limit)
         if limit is not None:
-            idxs = idxs[:limit]
-            scores = scores[:limit]
-            total_results = len(idxs)
+            total_results = min(max(limit, 0), total_results)
 
         # Pagination
         start = (page - 1) * per_page
-        end = start + per_page
-        idxs_page = idxs[start:end]
-        scores_page = scores[start:end]
-
-        for i, s in zip(idxs_page, scores_page):
-            critique_text = df.iloc[int(i)]["critique"]
-            sim_percent = f"{s * 100:.1f}%"
-            short_text = critique_text[:200] + ("..." if len(critique_text) > 200 else "")
-            
-            # Déterminer la couleur en fonction du score de similarité
-            if s >= 0.8:
-                score_color = "text-green-600"
-            elif s >= 0.6:
-                score_color = "text-yellow-600"
-            elif s >= 0.4:
-                score_color = "text-orange-600"
-            else:
-                score_color = "text-red-600"
-                
-            results_html += f"""
-            <div class="bg-white rounded-xl shadow-md p-6 mb-4 hover:shadow-lg transition-shadow duration-300 result-item">
-                <div class="flex justify-between items-start mb-3">
-                    <span class="text-sm text-gray-500">ID: {i}</span>
-                    <span class="text-lg font-semibold {score_color}">Similarité de {sim_percent}</span>
-                </div>
-                <div class="text-gray-800 critique-cell break-words overflow-wrap-anywhere">
-                    <p class="short-text">{short_text}</p>
-                    <p class="full-text hidden mt-2">{critique_text}</p>
-                    {"<button class='toggle-btn mt-2 text-blue-500 hover:text-blue-700 font-medium text-sm transition-colors duration-200'>Voir plus →</button>" if len(critique_text) > 200 else ""}
-                </div>
-            </div>
-            """
+        end = min(start + per_page, total_results)
+        with stage("ranking"):
+            idxs_page, scores_page = ranked.window(start, end)
+        titles = registry.titles()
+
+        # Textes et métadonnées de la page, puis assemblage HTML (chronométrés séparément)
+        with stage("fetch"):
+            page_hits = [(doc_film, i, s, get_critique(m, doc_film, i), review_label(m, doc_film, i))
+                         for (doc_film, i), s in zip(locate(film, m, idxs_page), scores_page)]
+        t_render = time.perf_counter()
+
+        for doc_film, i, s, critique_text, review_info in page_hits:
+            id_label = f"{titles.get(doc_film, doc_film)} · ID: {i}" if film == ALL_FILMS else f"ID: {i}"
+            results_html += result_card(doc_film, i, s, critique_text, review_info, id_label)
 
         total_pages = (total_results + per_page - 1) // per_page
         if (limit is None or limit > per_page) and total_pages > 1:
@@ -145,6 +512,7 @@ def home(
                     <input type="hidden" name="page" value="{page-1}">
                     <input type="hidden" name="per_page" value="{per_page}">
                     {"<input type='hidden' name='limit' value='" + str(limit) + "'>" if limit else ""}
+                    {filter_hidden}
                     <button type="submit" class="px-4 py-2 rounded-lg bg-gray-200 hover:bg-gray-300 transition-colors duration-200 text-gray-800">
                         <i class="fas fa-chevron-left"></i>
                     </button>
@@ -159,6 +527,7 @@ def home(
                     <input type="hidden" name="page" value="1">
                     <input type="hidden" name="per_page" value="{per_page}">
                     {"<input type='hidden' name='limit' value='" + str(limit) + "'>" if limit else ""}
+                    {filter_hidden}
                     <button type="submit" class="px-4 py-2 rounded-lg bg-gray-200 hover:bg-gray-300 transition-colors duration-200 text-gray-800">1</button>
                 </form>
                 """
@@ -174,6 +543,7 @@ def home(
                     <input type="hidden" name="page" value="{p}">
                     <input type="hidden" name="per_page" value="{per_page}">
                     {"<input type='hidden' name='limit' value='" + str(limit) + "'>" if limit else ""}
+                    {filter_hidden}
                     <button type="submit" class="px-4 py-2 rounded-lg {active} transition-colors duration-200">{p}</button>
                 </form>
                 """
@@ -188,6 +558,7 @@ def home(
                     <input type="hidden" name="page" value="{total_pages}">
                     <input type="hidden" name="per_page" value="{per_page}">
                     {"<input type='hidden' name='limit' value='" + str(limit) + "'>" if limit else ""}
+                    {filter_hidden}
                     <button type="submit" class="px-4 py-2 rounded-lg bg-gray-200 hover:bg-gray-300 transition-colors duration-200 text-gray-800">{total_pages}</button>
                 </form>
                 """
@@ -201,6 +572,7 @@ def home(
                     <input type="hidden" name="page" value="{page+1}">
                     <input type="hidden" name="per_page" value="{per_page}">
                     {"<input type='hidden' name='limit' value='" + str(limit) + "'>" if limit else ""}
+                    {filter_hidden}
                     <button type="submit" class="px-4 py-2 rounded-lg bg-gray-200 hover:bg-gray-300 transition-colors duration-200 text-gray-800">
                         <i class="fas fa-chevron-right"></i>
                     </button>
@@ -217,14 +589,16 @@ def home(
                 <input type="hidden" name="text" value='{text.replace("'", "&#39;")}'>
                 <input type="hidden" name="page" value="1">
                 <input type="hidden" name="per_page" value="{per_page}">
+                {filter_hidden}
                 <label class="text-gray-700 font-medium">Limiter le nombre de résultats :</label>
                 <input type="number" name="limit" value="{limit if limit else ''}" min="1" class="border rounded-lg p-2 w-32 focus:ring-2 focus:ring-blue-300 focus:outline-none text-gray-800" placeholder="ex: 6">
                 <button type="submit" class="bg-green-500 text-white rounded-lg px-4 py-2 hover:bg-green-600 transition-colors duration-200"> Appliquer </button>
-                {"<a href='/?film=" + film + "&text=" + text.replace("'", "%27") + "&page=1&per_page=" + str(per_page) + "' class='bg-red-500 text-white rounded-lg px-4 py-2 hover:bg-red-600 transition-colors duration-200'>Supprimer le filtre</a>" if limit else ""}
+                {"<a href='/?film=" + film + "&text=" + text.replace("'", "%27") + "&page=1&per_page=" + str(per_page) + filter_qs + "' class='bg-red-500 text-white rounded-lg px-4 py-2 hover:bg-red-600 transition-colors duration-200'>Supprimer le filtre</a>" if limit else ""}
             </form>
         </div>
         """
     else:
+        t_render = time.perf_counter()
         results_html = """
         <div class="text-center py-12">
             <div class="inline-block p-4 bg-blue-50 rounded-full mb-4">
@@ -238,14 +612,17 @@ def home(
         """
 
     # Définir les couleurs d'arrière-plan selon le film sélectionné
-    header_bg = "bg-gradient-to-r from-purple-500 via-blue-500 to-teal-500"  # Défaut
-    button_bg = "bg-gradient-to-r from-purple-500 to-teal-500"
-    if film == "interstellar":
-        header_bg = "bg-gradient-to-r from-blue-700 via-purple-700 to-gray-900"
-        button_bg = "bg-gradient-to-r from-blue-700 to-gray-900"
-    elif film == "fightclub":
-        header_bg = "bg-gradient-to-r from-yellow-500 via-red-600 to-gray-800"
-        button_bg = "bg-gradient-to-r from-yellow-500 to-gray-800"
+    header_bg, button_bg = THEMES.get(film, (
+        "bg-gradient-to-r from-purple-500 via-blue-500 to-teal-500",  # Défaut
+        "bg-gradient-to-r from-purple-500 to-teal-500",
+    ))
+
+    # Options du sélecteur: films découverts + recherche dans tous les films
+    film_options = "".join(
+        f'<option value="{f}" {"selected" if film == f else ""}>{t}</option>'
+        for f, t in sorted(registry.titles().items(), key=lambda ft: ft[1].lower())
+    )
+    film_options += f'<option value="{ALL_FILMS}" {"selected" if film == ALL_FILMS else ""}>Tous les films</option>'
 
     # === HTML complet ===
     html_content = f"""
@@ -372,8 +749,7 @@ def home(
                                 <i class="fas fa-star mr-2"></i> Sélectionnez un film
                             </label>
                             <select name="film" class="w-full border border-gray-300 rounded-xl p-3 focus:ring-2 focus:ring-blue-300 focus:outline-none text-gray-800">
-                                <option value="interstellar" {"selected" if film=="interstellar" else ""}>Interstellar</option>
-                                <option value="fightclub" {"selected" if film=="fightclub" else ""}>Fight Club</option>
+                                {film_options}
                             </select>
                         </div>
                         
@@ -385,6 +761,33 @@ def home(
                         </div>
                     </div>
                     
+                    <div class="grid grid-cols-2 md:grid-cols-6 gap-4">
+                        <div>
+                            <label class="block text-sm font-medium mb-1 text-gray-700">Note min</label>
+                            <input type="number" name="min_rating" value="{filter_params.get('min_rating', '')}" min="0" max="10" step="0.5" class="w-full border border-gray-300 rounded-xl p-2 text-gray-800">
+                        </div>
+                        <div>
+                            <label class="block text-sm font-medium mb-1 text-gray-700">Note max</label>
+                            <input type="number" name="max_rating" value="{filter_params.get('max_rating', '')}" min="0" max="10" step="0.5" class="w-full border border-gray-300 rounded-xl p-2 text-gray-800">
+                        </div>
+                        <div>
+                            <label class="block text-sm font-medium mb-1 text-gray-700">Depuis le</label>
+                            <input type="date" name="date_from" value="{filter_params.get('date_from', '')}" class="w-full border border-gray-300 rounded-xl p-2 text-gray-800">
+                        </div>
+                        <div>
+                            <label class="block text-sm font-medium mb-1 text-gray-700">Jusqu'au</label>
+                            <input type="date" name="date_to" value="{filter_params.get('date_to', '')}" class="w-full border border-gray-300 rounded-xl p-2 text-gray-800">
+                        </div>
+                        <div>
+                            <label class="block text-sm font-medium mb-1 text-gray-700">Likes min</label>
+                            <input type="number" name="min_likes" value="{filter_params.get('min_likes', '')}" min="0" class="w-full border border-gray-300 rounded-xl p-2 text-gray-800">
+                        </div>
+                        <div>
+                            <label class="block text-sm font-medium mb-1 text-gray-700">Poids popularité</label>
+                            <input type="number" name="popularity" value="{filter_params.get('popularity', '')}" min="0" max="1" step="0.1" placeholder="0 à 1" class="w-full border border-gray-300 rounded-xl p-2 text-gray-800">
+                        </div>
+                    </div>
+
                     <div>
                         <label class="block text-lg font-medium mb-2 text-gray-700">
                             <i class="fas fa-pencil-alt mr-2"></i> Votre critique
@@ -397,9 +800,9 @@ def home(
                     </button>
                 </form>
                 
-                {"<hr class='border-gray-200 my-6'>" if text.strip() else ""}
+                {"<hr class='border-gray-200 my-6'>" if show_results else ""}
                 
-                {"<h2 class='text-2xl font-bold mb-6 flex items-center text-gray-800'><i class='fas fa-list mr-3'></i> Résultats</h2>" if text.strip() else ""}
+                {f"<h2 class='text-2xl font-bold mb-6 flex items-center text-gray-800'><i class='fas fa-list mr-3'></i> {results_title}</h2>" if show_results else ""}
                 
                 {filter_form_html if text.strip() else ""}
                 
@@ -417,4 +820,5 @@ def home(
     </body>
     </html>
     """
+    metrics.record_stage("render", time.perf_counter() - t_render)
     return html_content
\ No newline at end of file
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+# Colonnes SensCritique conservées par preprocess.py à côté de la critique
+META_COLUMNS = ["rating", "review_date_creation", "review_hits", "gen_review_like_count", "user_id"]
+DATE_FORMAT = "%d/%m/%y %H:%M"  # ex: 28/01/15 09:33
+
+
+# === Métadonnées des critiques en tableaux NumPy typés ===
+# Une ligne par critique, dans l'ordre des embeddings: note float32 (NaN si absente),
+# date datetime64[D] (NaT), likes / vues int32, user_id int64 (-1).
+# Les filtres sont des masques booléens vectorisés appliqués avant le top-k.
+class ReviewAttributes:
+    def __init__(self, rating, date, likes, hits, user_id):
+        self.rating = np.asarray(rating, dtype=np.float32)
+        self.date = np.asarray(date, dtype="datetime64[D]")
+        self.likes = np.asarray(likes, dtype=np.int32)
+        self.hits = np.asarray(hits, dtype=np.int32)
+        self.user_id = np.asarray(user_id, dtype=np.int64)
+        self._popularity = None
+
+    @classmethod
+    def empty(cls, n):
+        # index construit sans métadonnées: tout est "inconnu", aucun filtre ne passe
+        return cls(np.full(n, np.nan), np.full(n, np.datetime64("NaT"), dtype="datetime64[D]"),
+                   np.zeros(n), np.zeros(n), np.full(n, -1))
+
+    @classmethod
+    def from_frame(cls, df):
+        n = len(df)
+
+        def number(col, default):
+            if col not in df.columns:
+                return np.full(n, default, dtype=np.float64)
+            return pd.to_numeric(df[col], errors="coerce").fillna(default).to_numpy(dtype=np.float64)
+
+        if "review_date_creation" in df.columns:
+            date = pd.to_datetime(df["review_date_creation"], format=DATE_FORMAT, errors="coerce").to_numpy()
+        else:
+            date = np.full(n, np.datetime64("NaT"))
+        return cls(number("rating", np.nan), date.astype("datetime64[D]"), number("gen_review_like_count", 0),
+                   number("review_hits", 0), number("user_id", -1))
+
+    @classmethod
+    def concat(cls, parts):
+        return cls(*(np.concatenate([getattr(p, name) for p in parts]) for name in cls.fields()))
+
+    @staticmethod
+    def fields():
+        return ("rating", "date", "likes", "hits", "user_id")
+
+    def slice(self, start, end):
+        # vues sur les tableaux (pas de copie), pour pointer un film dans l'index global
+        return ReviewAttributes(*(getattr(self, name)[start:end] for name in self.fields()))
+
+    def take(self, rows):
+        # lignes choisies (copie), ex: critiques conservées après dédoublonnage
+        return ReviewAttributes(*(getattr(self, name)[rows] for name in self.fields()))
+
+    def save(self, f):
+        np.savez(f, **{name: getattr(self, name) for name in self.fields()})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(*(z[name] for name in cls.fields()))
+
+    def __len__(self):
+        return self.rating.shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.fields())
+
+    @property
+    def has_metadata(self):
+        return bool(len(self)) and not np.isnan(self.rating).all()
+
+    def popularity(self):
+        # likes sur une échelle log ramenée à [0, 1] (quelques critiques très likées écrasent sinon tout le reste)
+        if self._popularity is None:
+            pop = np.log1p(np.maximum(self.likes, 0).astype(np.float32))
+            top = pop.max() if pop.size else 0.0
+            self._popularity = pop / top if top > 0 else pop
+        return self._popularity
+
+    def mask(self, min_rating=None, max_rating=None, date_from=None, date_to=None, min_likes=None):
+        # None = aucun filtre; les valeurs inconnues (NaN / NaT) ne passent pas un filtre sur leur colonne
+        keep = None
+
+        def both(a, b):
+            return b if a is None else a & b
+
+        if min_rating is not None:
+            keep = both(keep, self.rating >= min_rating)
+        if max_rating is not None:
+            keep = both(keep, self.rating <= max_rating)
+        if date_from is not None:
+            keep = both(keep, self.date >= np.datetime64(date_from, "D"))
+        if date_to is not None:
+            keep = both(keep, self.date <= np.datetime64(date_to, "D"))
+        if min_likes is not None:
+            keep = both(keep, self.likes >= min_likes)
+        return keep
+
+    def weights(self, popularity=0.0):
+        # score = similarité x ((1 - w) + w * popularité), w dans [0, 1]; None = similarité seule
+        if not popularity:
+            return None
+        return ((1.0 - popularity) + popularity * self.popularity()).astype(np.float32)
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# === Micro-batching des encodages de requêtes ===
+# Les requêtes concurrentes sont regroupées pendant quelques ms (ou jusqu'à
+# max_batch_size) puis encodées en un seul appel: un forward pass par lot au lieu
+# d'un par requête, et plus de threads torch qui se battent entre eux.
+class MicroBatcher:
+    def __init__(self, encode_fn, loop, max_batch_size=32, max_wait_ms=5.0):
+        self.encode_fn = encode_fn  # list[str] -> np.ndarray (n, dim)
+        self.loop = loop
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        # un seul thread d'encodage: les forward passes sont sérialisés
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_started(self):
+        # appelé dans la boucle asyncio
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = self.loop.create_task(self._run())
+
+    async def encode(self, text):
+        self._ensure_started()
+        fut = self.loop.create_future()
+        self._queue.put_nowait((text, fut))
+        return await fut
+
+    # Lot déjà constitué (API batch): un seul appel au modèle, sur le même thread d'encodage
+    async def encode_many(self, texts):
+        vecs = await self.loop.run_in_executor(self._executor, self.encode_fn, list(texts))
+        self.batches += 1
+        self.items += len(texts)
+        return vecs
+
+    # Depuis un thread du threadpool (endpoints sync), jamais depuis la boucle elle-même
+    def encode_blocking(self, text):
+        return asyncio.run_coroutine_threadsafe(self.encode(text), self.loop).result()
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            # laisser le temps aux requêtes concurrentes d'arriver
+            if self.max_wait > 0 and self._queue.qsize() < self.max_batch_size - 1:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            batch = [(t, f) for t, f in batch if not f.done()]
+            if not batch:
+                continue
+            texts = [t for t, _ in batch]
+            try:
+                vecs = await self.loop.run_in_executor(self._executor, self.encode_fn, texts)
+            except Exception as e:
+                for _, f in batch:
+                    if not f.done():
+                        f.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, f), v in zip(batch, vecs):
+                if not f.done():
+                    f.set_result(v)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            while not self._queue.empty():
+                _, f = self._queue.get_nowait()
+                if not f.done():
+                    f.cancel()
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+
+# Un MicroBatcher par encodeur (nom de modèle), liés à la boucle de l'app
+class BatcherPool:
+    def __init__(self, loop, max_batch_size=32, max_wait_ms=5.0):
+        self.loop = loop
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._batchers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name, encoder):
+        batcher = self._batchers.get(model_name)
+        if batcher is None:
+            with self._lock:
+                batcher = self._batchers.get(model_name)
+                if batcher is None:
+                    def encode_fn(texts):
+                        return encoder.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+                    batcher = MicroBatcher(encode_fn, self.loop, self.max_batch_size, self.max_wait_ms)
+                    self._batchers[model_name] = batcher
+        return batcher
+
+    async def close(self):
+        for batcher in list(self._batchers.values()):
+            await batcher.close()
+        self._batchers.clear()
+
+    def stats(self):
+        return {name: b.stats() for name, b in self._batchers.items()}
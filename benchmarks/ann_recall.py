@@ -0,0 +1,90 @@
+import argparse
+import json
+import time
+import numpy as np
+from ann import IVFIndex
+from search import SearchIndex, l2_normalize, top_k
+
+# === Benchmark recall@k / latence: IVF vs recherche exacte ===
+# Usage:
+#   python -m benchmarks.ann_recall --film fightclub --nlist 32 64 --nprobe 1 2 4 8 16
+#   python -m benchmarks.ann_recall --synthetic 200000 --nlist 1024 --nprobe 8 16 32 64
+
+
+def synthetic_corpus(n, dim=384, n_topics=500, seed=0):
+    # mélange de gaussiennes: grossièrement la structure "par thèmes" des critiques
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    X = centers[rng.integers(0, n_topics, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return X
+
+
+def make_queries(X, n_queries, noise=0.3, seed=1):
+    # requêtes = documents du corpus bruités (pas besoin du modèle SBERT)
+    rng = np.random.default_rng(seed)
+    Q = X[rng.choice(X.shape[0], n_queries, replace=False)]
+    return l2_normalize(l2_normalize(Q) + noise * rng.standard_normal(Q.shape).astype(np.float32) / np.sqrt(Q.shape[1]))
+
+
+def timed(fn, queries, k):
+    out = []
+    t0 = time.perf_counter()
+    for q in queries:
+        out.append(fn(q, k)[0])
+    return out, (time.perf_counter() - t0) / len(queries) * 1000.0
+
+
+def recall(found, truth):
+    return float(np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def run(X, nlists, nprobes, k, n_queries):
+    exact = SearchIndex(X)
+    Q = make_queries(exact.X, min(n_queries, X.shape[0]))
+    truth, exact_ms = timed(lambda q, k: top_k(exact.X @ q, k), Q, k)
+    print(f"[+] exact: {exact_ms:.3f} ms/query (n={exact.n})")
+    rows = [{"method": "exact", "recall": 1.0, "ms_per_query": exact_ms}]
+
+    for nlist in nlists:
+        t0 = time.perf_counter()
+        ivf = IVFIndex.build(X, nlist=nlist)
+        build_s = time.perf_counter() - t0
+        for nprobe in nprobes:
+            if nprobe > ivf.nlist:
+                continue
+            index = SearchIndex(X, ann=ivf, nprobe=nprobe)
+            index.X = exact.X  # partage de la matrice normalisée
+            found, ms = timed(index.search, Q, k)
+            r = recall(found, truth)
+            print(f"[+] ivf nlist={ivf.nlist:5d} nprobe={nprobe:4d}: recall@{k}={r:.3f}  {ms:.3f} ms/query  (x{exact_ms / ms:.1f})")
+            rows.append({"method": "ivf", "nlist": ivf.nlist, "nprobe": nprobe, "recall": r,
+                         "ms_per_query": ms, "build_s": build_s})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--film", default=None)  # embeddings de la version servie du film (models/<film>/CURRENT)
+    parser.add_argument("--model_dir", default="models")
+    parser.add_argument("--synthetic", type=int, default=None)  # ou un corpus synthétique de N docs
+    parser.add_argument("--nlist", type=int, nargs="+", default=[None])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", default=None)  # fichier de sortie des résultats
+    args = parser.parse_args()
+
+    if args.synthetic:
+        X = synthetic_corpus(args.synthetic)
+    elif args.film:
+        from registry import ModelRegistry  # charge torch: seulement pour un vrai film
+        registry = ModelRegistry(args.model_dir)
+        registry.discover()
+        X = np.load(registry.path(args.film, "X.npy"))
+    else:
+        parser.error("--film ou --synthetic requis")
+
+    rows = run(X, args.nlist, args.nprobe, args.k, args.queries)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
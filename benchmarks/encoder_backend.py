@@ -0,0 +1,87 @@
+import argparse
+import json
+import time
+import joblib
+import numpy as np
+from docstore import read_clean_csv
+from encoders import BACKENDS, configure_torch_threads, load_encoder
+from registry import ModelRegistry
+from search import SearchIndex
+
+# === Benchmark hors ligne des backends de l'encodeur de requêtes ===
+# Latence d'encodage (une requête à la fois, comme au service) et recouvrement du
+# top-k obtenu avec chaque backend vs fp32 sur l'index existant du film.
+# Usage:
+#   python -m benchmarks.encoder_backend --film interstellar --queries 200 --threads 4
+
+
+def sample_queries(clean_csv, n, max_words=40, seed=0):
+    # débuts de critiques réelles: longueur proche d'une requête utilisateur
+    texts = [t for t in read_clean_csv(clean_csv) if t.strip()]
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(texts), min(n, len(texts)), replace=False)
+    return [" ".join(texts[i].split()[:max_words]) for i in picks]
+
+
+def encode_latency(model, queries):
+    model.encode(queries[:1], convert_to_numpy=True)  # warmup
+    times = []
+    vecs = []
+    for q in queries:
+        t0 = time.perf_counter()
+        vecs.append(model.encode([q], convert_to_numpy=True)[0])
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return np.stack(vecs), np.array(times)
+
+
+def run(film, model_dir, model_name, backends, n_queries, k, max_seq_length, threads):
+    print(f"[+] torch threads: {configure_torch_threads(threads)}")
+    registry = ModelRegistry(model_dir)
+    registry.discover()  # fichiers de la version servie (models/<film>/CURRENT) ou format à plat
+    meta = joblib.load(registry.path(film, "meta.joblib"))
+    model_name = model_name or joblib.load(registry.path(film, "encoder.joblib"))
+    index = SearchIndex(np.load(registry.path(film, "X.npy"), mmap_mode="r"),
+                        normalized=meta.get("normalized", False))
+    queries = sample_queries(meta["csv"], n_queries)
+
+    results = {}
+    for backend in backends:
+        model = load_encoder(model_name, backend, max_seq_length)
+        vecs, times = encode_latency(model, queries)
+        top = [index.search(v, k)[0] for v in vecs]
+        results[backend] = {"vecs": vecs, "top": top, "times": times}
+        del model
+
+    ref = results["fp32"] if "fp32" in results else results[backends[0]]
+    rows = []
+    for backend, r in results.items():
+        overlap = float(np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(r["top"], ref["top"])]))
+        cos = float(np.mean(np.sum(r["vecs"] * ref["vecs"], axis=1)
+                            / (np.linalg.norm(r["vecs"], axis=1) * np.linalg.norm(ref["vecs"], axis=1))))
+        row = {"backend": backend, "p50_ms": float(np.percentile(r["times"], 50)),
+               "p95_ms": float(np.percentile(r["times"], 95)), "mean_ms": float(r["times"].mean()),
+               f"overlap@{k}": overlap, "cosine_vs_fp32": cos}
+        print(f"[+] {backend:5s}: p50={row['p50_ms']:.2f} ms  p95={row['p95_ms']:.2f} ms  "
+              f"overlap@{k}={overlap:.3f}  cos={cos:.4f}")
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--film", required=True)
+    parser.add_argument("--model_dir", default="models")
+    parser.add_argument("--model_name", default=None)  # défaut: celui de l'index du film
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max_seq_length", type=int, default=128)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    rows = run(args.film, args.model_dir, args.model_name, args.backends, args.queries, args.k,
+               args.max_seq_length, args.threads)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
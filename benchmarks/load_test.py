@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import numpy as np
+from benchmarks.encoder_backend import sample_queries
+from capture import load_requests
+import metrics
+
+# === Benchmark de charge: rejoue un journal de requêtes de recherche ===
+# Le journal (JSONL) est capturé sur l'app réelle (CAPTURE_REQUESTS=...) ou généré à
+# partir de débuts de critiques; il est rejoué à concurrence fixée, dans le process
+# (app ASGI, sans réseau) ou en HTTP contre uvicorn. Les étapes du chemin de recherche
+# (encode, similarité, classement, lecture des textes, rendu HTML) sont aussi mesurées
+# séparément. Résultats en JSON, comparables d'un commit à l'autre (--compare).
+# Usage:
+#   CAPTURE_REQUESTS=bench/requests.jsonl uvicorn app:app --port 8000
+#   python -m benchmarks.load_test --generate 500
+#   python -m benchmarks.load_test --concurrency 1 8 32 --requests 500 --json bench/run.json
+#   python -m benchmarks.load_test --mode http --url http://127.0.0.1:8000 --concurrency 8
+#   python -m benchmarks.load_test --compare bench/base.json bench/run.json
+
+DEFAULT_LOG = "bench/requests.jsonl"
+
+
+def summarize(times_ms):
+    t = np.asarray(times_ms, dtype=np.float64)
+    if t.size == 0:
+        return {"n": 0}
+    return {"n": int(t.size), "mean_ms": float(t.mean()), "p50_ms": float(np.percentile(t, 50)),
+            "p95_ms": float(np.percentile(t, 95)), "p99_ms": float(np.percentile(t, 99)), "max_ms": float(t.max())}
+
+
+def generate_log(path, n, model_dir="models", seed=0):
+    # requêtes répétées selon une loi de Zipf (quelques requêtes populaires, une longue traîne):
+    # les caches travaillent comme en production
+    from registry import ModelRegistry
+    films = {f: info for f, info in ModelRegistry(model_dir).discover().items()
+             if info["clean_csv"] and os.path.exists(info["clean_csv"])}
+    if not films:
+        raise SystemExit(f"[!] Aucun film avec CSV nettoyé dans {model_dir}. Lancez build_index.py.")
+    pool = [(film, q) for film, info in films.items() for q in sample_queries(info["clean_csv"], 200, max_words=25, seed=seed)]
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(pool))
+    entries = []
+    for rank in (rng.zipf(1.3, n) - 1) % len(pool):
+        film, text = pool[order[rank]]
+        u = rng.random()
+        if u < 0.7:  # UI: première page, parfois la suivante
+            params = {"film": film, "text": text, "per_page": "10", "page": "2" if rng.random() < 0.15 else "1"}
+            entries.append({"method": "GET", "path": "/", "params": params})
+        elif u < 0.9:  # API JSON
+            entries.append({"method": "POST", "path": "/api/search", "params": {},
+                            "json": {"film": film, "texts": [text], "top_k": 10, "include_text": True}})
+        else:  # tous les films
+            entries.append({"method": "GET", "path": "/", "params": {"film": "all", "text": text, "per_page": "10"}})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+    print(f"[+] {len(entries)} requests ({len(set(map(json.dumps, entries)))} distinct) written to {path}")
+
+
+async def send(client, entry):
+    return await client.request(entry["method"], entry["path"], params=entry.get("params") or None,
+                                json=entry.get("json"))
+
+
+async def replay(client, log, concurrency, total):
+    # total requêtes (le journal est parcouru en boucle), concurrency clients en parallèle
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(log[i % len(log)])
+    times, statuses = [], {}
+
+    async def worker():
+        while not queue.empty():
+            entry = queue.get_nowait()
+            t0 = time.perf_counter()
+            try:
+                status = (await send(client, entry)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            times.append((time.perf_counter() - t0) * 1000.0)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    errors = sum(c for s, c in statuses.items() if not (isinstance(s, int) and s < 400))
+    return {"concurrency": concurrency, "requests": total, "errors": errors,
+            "statuses": {str(s): c for s, c in statuses.items()},
+            "wall_s": wall, "throughput_rps": total / wall if wall > 0 else 0.0, **summarize(times)}
+
+
+async def run_levels(client, log, levels, total, warmup):
+    if warmup:
+        await replay(client, log, max(levels), min(warmup, total))
+    rows = []
+    for c in levels:
+        row = await replay(client, log, c, total)
+        print(f"[+] concurrency={c:3d}: {row['throughput_rps']:8.1f} req/s  p50={row['p50_ms']:.1f} ms  "
+              f"p95={row['p95_ms']:.1f} ms  p99={row['p99_ms']:.1f} ms  errors={row['errors']}")
+        rows.append(row)
+    return rows
+
+
+def call_endpoint(fn, **kwargs):
+    # appel direct d'un endpoint FastAPI: les paramètres absents prennent la valeur par défaut de leur Query()
+    for name, p in inspect.signature(fn).parameters.items():
+        if name not in kwargs:
+            kwargs[name] = getattr(p.default, "default", p.default)
+    return fn(**kwargs)
+
+
+def stage_benchmark(appmod, log, n, per_page=10):
+    # chaque étape du chemin GET / mesurée seule, sans les caches de l'app (le rendu HTML est lu dans home())
+    queries = [(e["params"]["film"], e["params"]["text"]) for e in log
+               if e["path"] == "/" and e["params"].get("text", "").strip() and e["params"].get("film")]
+    queries = list(dict.fromkeys(queries))[:n]
+    times = {s: [] for s in ("encode", "similarity", "ranking", "text_fetch", "html_render")}
+
+    def timed(stage, fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        times[stage].append((time.perf_counter() - t0) * 1000.0)
+        return out
+
+    for film, text in queries:
+        m = appmod.search_target(film)
+        text = appmod.normalize_query(text)
+        q = timed("encode", lambda: m["encoder"].encode([text], convert_to_numpy=True)[0])
+        ranked = timed("similarity", m["index"].rank, q)
+        idx, _ = timed("ranking", ranked.window, 0, per_page)
+        timed("text_fetch", lambda: [appmod.get_critique(m, f, i) for f, i in appmod.locate(film, m, idx)])
+        # rendu HTML seul: l'étape "render" chronométrée par home() (classement déjà en cache)
+        call_endpoint(appmod.home, film=film, text=text, per_page=per_page)
+        with metrics.collect_stages() as stages:
+            call_endpoint(appmod.home, film=film, text=text, per_page=per_page)
+        times["html_render"].append(stages.get("render", 0.0) * 1000.0)
+
+    stages = {s: summarize(t) for s, t in times.items()}
+    for s, r in stages.items():
+        if r["n"]:
+            print(f"[+] stage {s:12s}: p50={r['p50_ms']:.3f} ms  p95={r['p95_ms']:.3f} ms  (n={r['n']})")
+    return stages
+
+
+async def run_inprocess(log, levels, total, warmup, n_stages):
+    # app ASGI appelée directement (pas de réseau): mesure le coût de l'app seule
+    import app as appmod
+    async with appmod.app.router.lifespan_context(appmod.app):
+        transport = httpx.ASGITransport(app=appmod.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            rows = await run_levels(client, log, levels, total, warmup)
+        stages = await asyncio.get_running_loop().run_in_executor(None, stage_benchmark, appmod, log, n_stages) if n_stages else {}
+    return rows, stages
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(timeout=600):
+    # uvicorn lancé pour le benchmark, prêt quand GET /ready répond 200
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+                             "--log-level", "warning"])
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("[!] uvicorn s'est arrêté avant d'être prêt")
+        try:
+            if httpx.get(f"{url}/ready", timeout=2).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit("[!] uvicorn n'est pas prêt (timeout)")
+
+
+async def run_http(log, levels, total, warmup, url=None):
+    proc = None
+    if url is None:
+        proc, url = start_server()
+        print(f"[+] uvicorn started on {url}")
+    try:
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+            return await run_levels(client, log, levels, total, warmup)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    import config
+    return {"commit": commit or None, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "cpus": os.cpu_count(),
+            "config": {k: getattr(config, k) for k in dir(config) if k.isupper()}}
+
+
+def compare(base_path, new_path):
+    # variation relative (%) de chaque métrique entre deux runs
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"[+] {base['env'].get('commit')} -> {new['env'].get('commit')}")
+
+    def delta(a, b):
+        return f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+
+    base_rows = {(r["mode"], r["concurrency"]): r for r in base.get("replay", [])}
+    for r in new.get("replay", []):
+        b = base_rows.get((r["mode"], r["concurrency"]))
+        if b:
+            print(f"    {r['mode']:9s} c={r['concurrency']:3d}: req/s {delta(b['throughput_rps'], r['throughput_rps'])}  "
+                  f"p50 {delta(b['p50_ms'], r['p50_ms'])}  p95 {delta(b['p95_ms'], r['p95_ms'])}  p99 {delta(b['p99_ms'], r['p99_ms'])}")
+    for stage, r in new.get("stages", {}).items():
+        b = base.get("stages", {}).get(stage)
+        if b and b.get("n") and r.get("n"):
+            print(f"    stage {stage:12s}: p50 {delta(b['p50_ms'], r['p50_ms'])}  p95 {delta(b['p95_ms'], r['p95_ms'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", default=DEFAULT_LOG)  # journal JSONL à rejouer (capturé ou généré)
+    parser.add_argument("--generate", type=int, default=0)  # génère un journal synthétique de N requêtes puis s'arrête
+    parser.add_argument("--model_dir", default="models")
+    parser.add_argument("--mode", nargs="+", choices=["inprocess", "http"], default=["inprocess"])
+    parser.add_argument("--url", default=None)  # serveur existant (mode http), sinon uvicorn est lancé
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=500)  # requêtes par niveau de concurrence
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--stages", type=int, default=100)  # nb de requêtes pour les micro-benchmarks (0 = aucun)
+    parser.add_argument("--json", default=None)
+    parser.add_argument("--compare", nargs=2, default=None, metavar=("BASE", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+    if args.generate:
+        generate_log(args.log, args.generate, args.model_dir)
+        sys.exit(0)
+
+    log = load_requests(args.log)
+    if not log:
+        raise SystemExit(f"[!] Journal vide: {args.log}")
+    print(f"[+] {len(log)} requests loaded from {args.log}")
+    report = {"env": environment(), "log": args.log, "replay": [], "stages": {}}
+    for mode in args.mode:
+        print(f"[+] Replay {mode}")
+        if mode == "inprocess":
+            rows, report["stages"] = asyncio.run(run_inprocess(log, args.concurrency, args.requests, args.warmup, args.stages))
+        else:
+            rows = asyncio.run(run_http(log, args.concurrency, args.requests, args.warmup, args.url))
+        report["replay"] += [{"mode": mode, **r} for r in rows]
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[+] Results written to {args.json}")
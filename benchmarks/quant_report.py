@@ -0,0 +1,62 @@
+import argparse
+import json
+import numpy as np
+from benchmarks.ann_recall import make_queries, recall, synthetic_corpus, timed
+from quant import QUANTIZERS
+from search import SearchIndex, top_k
+
+# === Rapport mémoire / latence / recall: embeddings quantifiés vs float32 ===
+# Usage:
+#   python -m benchmarks.quant_report --film interstellar --shortlist 50 100 200
+#   python -m benchmarks.quant_report --synthetic 200000 --shortlist 100 400 --json quant.json
+
+
+def run(X, shortlists, k, n_queries):
+    exact = SearchIndex(X)
+    Q = make_queries(exact.X, min(n_queries, X.shape[0]))
+    truth, exact_ms = timed(lambda q, k: top_k(exact.X @ q, k), Q, k)
+    print(f"[+] float32: {exact.X.nbytes / 1e6:8.2f} MB  recall@{k}=1.000  {exact_ms:.3f} ms/query (n={exact.n})")
+    rows = [{"method": "float32", "bytes": int(exact.X.nbytes), "recall": 1.0, "ms_per_query": exact_ms}]
+
+    for kind, cls in QUANTIZERS.items():
+        qm = cls.build(exact.X)
+        # premier passage seul (sans re-scoring)
+        raw, raw_ms = timed(lambda q, k: top_k(qm.scores(q), k), Q, k)
+        print(f"[+] {kind:7s}: {qm.nbytes / 1e6:8.2f} MB (x{exact.X.nbytes / qm.nbytes:.0f} smaller)  "
+              f"no rescoring: recall@{k}={recall(raw, truth):.3f}  {raw_ms:.3f} ms/query")
+        rows.append({"method": kind, "bytes": int(qm.nbytes), "shortlist": 0,
+                     "recall": recall(raw, truth), "ms_per_query": raw_ms})
+        for size in shortlists:
+            index = SearchIndex(exact.X, normalized=True, quant=qm, shortlist=size)
+            found, ms = timed(index.search, Q, k)
+            r = recall(found, truth)
+            print(f"           shortlist={size:5d}: recall@{k}={r:.3f}  {ms:.3f} ms/query")
+            rows.append({"method": kind, "bytes": int(qm.nbytes), "shortlist": size, "recall": r, "ms_per_query": ms})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--film", default=None)  # embeddings de la version servie du film (models/<film>/CURRENT)
+    parser.add_argument("--model_dir", default="models")
+    parser.add_argument("--synthetic", type=int, default=None)  # ou un corpus synthétique de N docs
+    parser.add_argument("--shortlist", type=int, nargs="+", default=[50, 100, 200, 500])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        X = synthetic_corpus(args.synthetic)
+    elif args.film:
+        from registry import ModelRegistry  # charge torch: seulement pour un vrai film
+        registry = ModelRegistry(args.model_dir)
+        registry.discover()
+        X = np.load(registry.path(args.film, "X.npy"))
+    else:
+        parser.error("--film ou --synthetic requis")
+
+    rows = run(X, args.shortlist, args.k, args.queries)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
@@ -1,36 +1,259 @@
 import os
+import time
 import argparse
+import shutil
 import pandas as pd
 import joblib
 #from scipy import sparse
 #from nltk.corpus import stopwords
 import numpy as np
 from sentence_transformers import SentenceTransformer
+from ann import IVFIndex
+from attributes import ReviewAttributes
+from dedup import deduplicate
+from docstore import DocStore
+from fingerprint import corpus_checksum, text_keys
+from knn import KNNGraph
+from quant import QUANTIZERS
+from search import l2_normalize
 
-def build (clean_csv, model_dire="models" , model_name= "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2" ) : # main fct
-  
-    print( f"[+] Loading embedding model: {model_name}") 
-    model=SentenceTransformer (model_name) # elle telecharge et charge le modele d’embedding SentenceTransformers SBERT from Hugging Face lib
+def atomic_write(path, write_fn): # ecrit dans un fichier temporaire puis os.replace: jamais de fichier a moitie ecrit
+    tmp= f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        result= write_fn(f)
+    os.replace(tmp, path)
+    return result
+
+def load_embedding_cache(cache_chem): # cle sha1(model, texte) -> embedding
+    if not os.path.exists(cache_chem):
+        return {}
+    with np.load(cache_chem) as z:
+        return {k: v for k, v in zip(z["keys"].tolist(), z["vectors"])}
+
+class LazyModel: # un seul chargement du modele (et du pool multi-process) partage par tous les films du run
+    def __init__(self, model_name, processes=1):
+        self.model_name= model_name
+        self.processes= processes
+        self._model= None
+        self._pool= None
+
+    def get(self):
+        if self._model is None:
+            print( f"[+] Loading embedding model: {self.model_name}") 
+            self._model=SentenceTransformer (self.model_name) # elle telecharge et charge le modele d’embedding SentenceTransformers SBERT from Hugging Face lib
+        return self._model
+
+    def pool(self):
+        if self.processes > 1 and self._pool is None:
+            # chaque process garde sa part des coeurs, pas de sur-souscription des threads torch
+            os.environ["OMP_NUM_THREADS"]= str(max(1, (os.cpu_count() or 1) // self.processes))
+            print(f"[+] Starting {self.processes} encode processes")
+            self._pool= self.get().start_multi_process_pool(["cpu"] * self.processes)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool= None
+
+def token_lengths(model, texts): # nb de tokens apres troncature a max_seq_length
+    enc= model.tokenizer(texts, add_special_tokens=True, truncation=True, max_length=model.max_seq_length)
+    return np.array([len(ids) for ids in enc["input_ids"]], dtype=np.int64)
+
+def padding_ratio(lengths, batch_size): # part des tokens de padding si on batch dans cet ordre
+    slots= sum(int(lengths[i:i + batch_size].max()) * len(lengths[i:i + batch_size]) for i in range(0, len(lengths), batch_size))
+    return 1.0 - lengths.sum() / slots if slots else 0.0
+
+def encode_bucketed(lazy, texts, batch_size=32): # tri par longueur en tokens: des batchs de longueurs voisines, peu de padding
+    model= lazy.get()
+    lengths= token_lengths(model, texts)
+    order= np.argsort(-lengths, kind="stable")
+    sorted_texts= [texts[i] for i in order]
+    # reference reelle: encode() trie deja chaque appel par nombre de caracteres; l'ordre du CSV n'est qu'une borne theorique
+    char_order= np.argsort([-len(t) for t in texts], kind="stable")
+    print(f"[+] Padding ratio: {padding_ratio(lengths[char_order], batch_size):.1%} with encode()'s char-length sort -> {padding_ratio(lengths[order], batch_size):.1%} token-length bucketed ({padding_ratio(lengths, batch_size):.1%} unsorted, theoretical)")
+
+    t0= time.perf_counter()
+    pool= lazy.pool()
+    if pool is not None:
+        # les chunks contigus du tableau trie vont aux process: chacun recoit des longueurs voisines
+        emb_sorted= model.encode_multi_process(sorted_texts, pool, batch_size=batch_size)
+    else:
+        parts= []
+        for i in range(0, len(sorted_texts), batch_size):
+            parts.append(model.encode(sorted_texts[i:i + batch_size], batch_size=batch_size, convert_to_numpy=True))
+        emb_sorted= np.concatenate(parts)
+    elapsed= time.perf_counter() - t0
+    print(f"[+] Encoded {len(texts)} critiques in {elapsed:.1f}s ({len(texts) / max(elapsed, 1e-9):,.1f} docs/s)")
+
+    embeddings= np.empty_like(emb_sorted)
+    embeddings[order]= emb_sorted # retour a l'ordre du CSV
+    return embeddings
+
+def encode_incremental(critiques, lazy, cache_chem, batch_size=32): # n'encode que les critiques nouvelles ou modifiees
+    keys= text_keys(lazy.model_name, critiques)
+    klist= keys.tolist()
+    cache= load_embedding_cache(cache_chem)
+    missing= [i for i, k in enumerate(klist) if k not in cache]
+    print(f"[+] Embedding cache: {len(critiques) - len(missing)} reused, {len(missing)} to encode")
+
+    if missing:
+        print( "[+] Encoding the new critiques into embeddings ... " )
+        new= encode_bucketed(lazy, [critiques[i] for i in missing], batch_size)
+        for i, v in zip(missing, new):
+            cache[klist[i]]= v
+
+    if critiques:
+        embeddings= np.stack([cache[k] for k in klist]).astype(np.float32)
+    else: # corpus vide: index sans lignes mais a la dimension du modele, les recherches renvoient 0 resultat
+        embeddings= np.zeros((0, lazy.get().get_sentence_embedding_dimension()), dtype=np.float32)
+    # le nouveau cache ne garde que les critiques presentes: les supprimees disparaissent
+    atomic_write(cache_chem, lambda f: np.savez(f, keys=keys, vectors=embeddings))
+    return embeddings, keys
+
+def build_ann(embeddings, ann_chem, nlist=None, nprobe=None): # index IVF (k-means + listes inversees) pour les gros corpus
+    print(f" [+] Building IVF index (nlist={nlist or 'auto'}) ... ")
+    ivf= IVFIndex.build(embeddings, nlist=nlist, nprobe=nprobe)
+    sizes= ivf.list_sizes()
+    print(f" [+] IVF: {ivf.nlist} lists, nprobe={ivf.nprobe}, list size min/mean/max = {sizes.min()}/{sizes.mean():.1f}/{sizes.max()}")
+    print(f" [+] Saving IVF index in {ann_chem} ")
+    atomic_write(ann_chem, ivf.save)
+    return ann_chem
+
+def new_version(film_dir): # nom de version horodate, jamais reutilise
+    version= time.strftime("v%Y%m%d-%H%M%S")
+    name, i= version, 1
+    while os.path.exists(os.path.join(film_dir, name)):
+        i+= 1
+        name= f"{version}-{i}"
+    return name
+
+def publish_version(film_dir, version, keep=3): # bascule atomique du pointeur CURRENT puis menage des vieilles versions
+    with open(os.path.join(film_dir, "CURRENT.tmp"), "w") as f:
+        f.write(version)
+    os.replace(os.path.join(film_dir, "CURRENT.tmp"), os.path.join(film_dir, "CURRENT"))
+    versions= sorted(d for d in os.listdir(film_dir) if os.path.isdir(os.path.join(film_dir, d)))
+    for old in versions[:max(0, len(versions) - max(keep, 1))]:
+        if old != version: # les workers qui servent encore une vieille version gardent leurs fichiers mappes ouverts
+            shutil.rmtree(os.path.join(film_dir, old), ignore_errors=True)
+
+def previous_title(model_dire, base): # titre de l'index deja publie: un rebuild sans --title ne renomme pas le film
+    film_dir= os.path.join(model_dire, base)
+    metas= [os.path.join(model_dire, f"{base}_meta.joblib")]
+    if os.path.exists(os.path.join(film_dir, "CURRENT")):
+        with open(os.path.join(film_dir, "CURRENT")) as f:
+            metas.insert(0, os.path.join(film_dir, f.read().strip(), f"{base}_meta.joblib"))
+    for chem in metas:
+        if os.path.exists(chem):
+            title= joblib.load(chem).get("title")
+            if title:
+                return title
+    return None
+
+def build_knn(embeddings, ids_chem, scores_chem, k): # graphe des K voisins de chaque critique (produit exact par blocs)
+    t0= time.perf_counter()
+    graph= KNNGraph.build(embeddings, k)
+    print(f" [+] kNN graph: {graph.n} x {graph.k} in {time.perf_counter() - t0:.1f}s ({graph.nbytes / 1e6:.1f} MB), saving in {ids_chem}")
+    atomic_write(ids_chem, lambda f: np.save(f, graph.ids))
+    atomic_write(scores_chem, lambda f: np.save(f, graph.scores))
+    return graph
+
+def build (clean_csv, model_dire="models" , model_name= "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", ann=None, nlist=None, nprobe=None, incremental=False, lazy=None, batch_size=32, quantize=None, title=None, knn=20, versioned=True, keep=3, dedup="none", dedup_threshold=0.8 ) : # main fct
+    if lazy is None:
+        lazy= LazyModel(model_name)
 
     df= pd.read_csv(clean_csv, dtype=str).fillna("")
-    critiques= df["critique"].astype(str).tolist() #cleared CSV files only have 1 column named "critique"
+    critiques= df["critique"].astype(str).tolist() #colonne "critique" + metadonnees optionnelles (note, date, likes...)
+    checksum= corpus_checksum(critiques) # sur le CSV complet: c'est lui que l'app compare au chargement
+    attrs= ReviewAttributes.from_frame(df)
+
+    # dedoublonnage avant l'encodage: une critique par groupe de doublons (la plus likee), avec la taille du groupe
+    dedup_stats, copies= None, None
+    if dedup != "none" and critiques:
+        t0= time.perf_counter()
+        keep_rows, copies, dedup_stats= deduplicate(critiques, dedup_threshold if dedup == "near" else None, attrs.likes)
+        print(f"[+] Dedup: {dedup_stats['rows']} critiques -> {dedup_stats['docs']} ({dedup_stats['exact']} exact, {dedup_stats['near']} near duplicates) in {time.perf_counter() - t0:.1f}s")
+        critiques= [critiques[i] for i in keep_rows]
+        attrs= attrs.take(keep_rows)
 
-    print( "[+] Encoding the files' critiques into embeddings ... " )
-    embeddings= model.encode( critiques, batch_size =32 , show_progress_bar = True , convert_to_numpy= True )
-   
     # Partie creation du dossier models + chemin pour embeddings, metadonnees etc
     os.makedirs(model_dire , exist_ok=True)
     base= os.path.splitext(os.path.basename(clean_csv))[0].replace("_clean", "" )
-    vec_chem= os.path.join(model_dire , f"{base}_encoder.joblib" ) 
-    X_chem= os.path.join(model_dire ,  f"{base}_X.npy") #results embeddings chemin
-    meta_chem= os.path.join(model_dire , f"{base}_meta.joblib" )
+    # index versionne: models/<film>/<version>/, publie a la fin via models/<film>/CURRENT (rechargement a chaud)
+    film_dir= os.path.join(model_dire , base )
+    version= new_version(film_dir) if versioned else None
+    out_dire= os.path.join(film_dir , version) if versioned else model_dire
+    os.makedirs(out_dire , exist_ok=True)
+    vec_chem= os.path.join(out_dire , f"{base}_encoder.joblib" ) 
+    X_chem= os.path.join(out_dire ,  f"{base}_X.npy") #results embeddings chemin
+    meta_chem= os.path.join(out_dire , f"{base}_meta.joblib" )
+    cache_chem= os.path.join(model_dire , f"{base}_embcache.npz" ) # cache persistant des embeddings par contenu, partage entre versions
+
+    if not incremental and os.path.exists(cache_chem): # build complet: on repart de zero
+        os.remove(cache_chem)
+    embeddings, _= encode_incremental(critiques, lazy, cache_chem, batch_size)
+    # normalises une fois pour toutes: l'app les memory-map et les utilise sans copie
+    embeddings= l2_normalize(embeddings)
 
     print(f" [+] Saving encoder reference in {vec_chem} ")
-    joblib.dump(model_name , vec_chem) 
+    atomic_write(vec_chem, lambda f: joblib.dump(model_name , f))
     print(f" [+] Saving embeddings in { X_chem } ")
-    np.save( X_chem, embeddings)
+    atomic_write(X_chem, lambda f: np.save(f, embeddings))
+
+    # document store: blob UTF-8 + offsets int64, lus par l'app sans pandas
+    docs_chem= os.path.join(out_dire , f"{base}_docs.bin" )
+    offsets_chem= os.path.join(out_dire , f"{base}_offsets.npy" )
+    print(f" [+] Saving document store in {docs_chem} ")
+    offsets= atomic_write(docs_chem, lambda f: DocStore.write(critiques, f))
+    atomic_write(offsets_chem, lambda f: np.save(f, offsets))
+
+    # metadonnees en tableaux types (note, date, likes, vues, user_id) pour les filtres de recherche
+    attrs_chem= os.path.join(out_dire , f"{base}_attrs.npz" )
+    print(f" [+] Saving review metadata in {attrs_chem} ({attrs.nbytes / 1e3:.1f} KB)")
+    atomic_write(attrs_chem, attrs.save)
+
+    # taille du groupe de doublons de chaque critique conservee ("N copies similaires" dans l'UI)
+    copies_chem= os.path.join(out_dire , f"{base}_copies.npy" )
+    if copies is not None:
+        atomic_write(copies_chem, lambda f: np.save(f, copies))
+    elif os.path.exists(copies_chem):
+        os.remove(copies_chem)
+
+    ann_chem= os.path.join(out_dire , f"{base}_ivf.npz" )
+    if ann == "ivf":
+        build_ann(embeddings, ann_chem, nlist, nprobe)
+    elif os.path.exists(ann_chem): # ancien index ANN qui ne correspond plus aux embeddings
+        os.remove(ann_chem)
+
+    # graphe kNN pour "critiques similaires" (/similar), recalcule en entier: il depend de tout le corpus
+    knn_ids_chem= os.path.join(out_dire , f"{base}_knn_ids.npy" )
+    knn_scores_chem= os.path.join(out_dire , f"{base}_knn_scores.npy" )
+    if knn and embeddings.shape[0] > 1:
+        build_knn(embeddings, knn_ids_chem, knn_scores_chem, knn)
+    else:
+        for chem in (knn_ids_chem, knn_scores_chem):
+            if os.path.exists(chem):
+                os.remove(chem)
+
+    # embeddings quantifies (int8 scalaire / binaire 1 bit) + parametres de calibration
+    for kind, cls in QUANTIZERS.items():
+        quant_chem= os.path.join(out_dire , f"{base}_{kind}.npz" )
+        if kind in (quantize or []):
+            qm= cls.build(embeddings)
+            print(f" [+] Saving {kind} embeddings in {quant_chem} ({qm.nbytes / 1e6:.1f} MB vs {embeddings.nbytes / 1e6:.1f} MB float32)")
+            atomic_write(quant_chem, qm.save)
+        elif os.path.exists(quant_chem): # ancienne version qui ne correspond plus aux embeddings
+            os.remove(quant_chem)
+
+    # meta en dernier: model, dimension, nb de lignes et checksum du contenu permettent a app.py de detecter un index perime
+    meta= {"n_docs": embeddings.shape[0], "n_rows": len(df), "csv": clean_csv, "model_name": model_name,
+           "dim": int(embeddings.shape[1]), "checksum": checksum,
+           "normalized": True, "title": title or previous_title(model_dire, base) or base.replace("_", " ").title(), "version": version, "dedup": dedup_stats}
     print(f" [+] Saving meta in { meta_chem} ")
-    joblib.dump({"n_docs": embeddings.shape[0], "csv": clean_csv} , meta_chem)
+    atomic_write(meta_chem, lambda f: joblib.dump(meta , f))
+    if versioned:
+        publish_version(film_dir, version, keep)
+        print(f" [+] Published version {version} ({os.path.join(film_dir, 'CURRENT')})")
     print("[+] Done. ")
 
     return vec_chem ,X_chem, meta_chem
@@ -40,9 +263,31 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
 
-    parser.add_argument( "--clean_csv" , required=True)
+    parser.add_argument( "--clean_csv" , required=True, nargs="+") # un ou plusieurs films, un seul chargement du modele
     parser.add_argument("--model_dir" , default = "models") # ou to store models
     parser.add_argument("--model_name" , default = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+    parser.add_argument("--ann" , choices=["ivf"], default=None) # index approximatif optionnel, sinon recherche exacte
+    parser.add_argument("--nlist" , type=int, default=None) # nb de listes IVF (defaut ~4*sqrt(n))
+    parser.add_argument("--nprobe" , type=int, default=None) # nb de listes sondees par requete (defaut nlist/16)
+    parser.add_argument("--incremental" , action="store_true") # reutilise le cache d'embeddings: n'encode que les critiques nouvelles/modifiees
+    parser.add_argument("--quantize" , nargs="+", choices=list(QUANTIZERS), default=None) # int8 et/ou binary, re-scoring exact au service
+    parser.add_argument("--knn" , type=int, default=20) # nb de voisins precalcules par critique (0 = pas de graphe)
+    parser.add_argument("--flat" , action="store_true") # ancien format models/<film>_*.* (pas de rechargement a chaud)
+    parser.add_argument("--keep" , type=int, default=3) # nb de versions conservees par film
+    parser.add_argument("--dedup" , choices=["none", "exact", "near"], default="none") # opt-in: doublons exacts (texte normalise) puis quasi-doublons (MinHash/LSH); les ids ne sont plus les lignes du CSV
+    parser.add_argument("--dedup_threshold" , type=float, default=0.8) # similarite de Jaccard (shingles de 3 mots) des quasi-doublons
+    parser.add_argument("--title" , default=None) # nom affiche dans l'UI (un seul film), defaut: titre de l'index deja publie, sinon nom du fichier
+    parser.add_argument("--batch_size" , type=int, default=32)
+    parser.add_argument("--processes" , type=int, default=1) # process d'encodage en parallele (0 = tous les coeurs)
     
     args = parser.parse_args()
-    build(args.clean_csv, args.model_dir, args.model_name)
+    if args.title and len(args.clean_csv) > 1:
+        parser.error("--title ne peut etre utilise qu'avec un seul film")
+    lazy= LazyModel(args.model_name, args.processes or os.cpu_count() or 1)
+    try:
+        for clean_csv in args.clean_csv:
+            build(clean_csv, model_dire=args.model_dir, model_name=args.model_name, ann=args.ann, nlist=args.nlist, nprobe=args.nprobe,
+                  incremental=args.incremental, lazy=lazy, batch_size=args.batch_size, quantize=args.quantize, title=args.title,
+                  knn=args.knn, versioned=not args.flat, keep=args.keep, dedup=args.dedup, dedup_threshold=args.dedup_threshold)
+    finally:
+        lazy.close()
@@ -0,0 +1,63 @@
+import json
+import threading
+import time
+from urllib.parse import parse_qsl
+
+# Endpoints de recherche enregistrés (les autres ne sont pas rejoués)
+CAPTURED_PATHS = ("/", "/api/search")
+
+
+# === Journal des requêtes de recherche (JSONL) ===
+# Une ligne par requête: {"t", "method", "path", "params", "json"}; rejoué par
+# benchmarks/load_test.py. Fichier ouvert en append: plusieurs workers peuvent y écrire.
+class RequestLog:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        self.count = 0
+
+    def record(self, method, path, query_string=b"", body=b""):
+        entry = {"t": round(time.time(), 3), "method": method, "path": path,
+                 "params": dict(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True))}
+        if body:
+            try:
+                entry["json"] = json.loads(body)
+            except ValueError:
+                return  # corps invalide: la requête a été rejetée par l'app, rien à rejouer
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        self._file.close()
+
+
+def load_requests(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# Middleware ASGI: recopie le corps reçu au passage (sans le consommer) et journalise
+# la requête une fois la réponse envoyée
+class CaptureMiddleware:
+    def __init__(self, app, log, paths=CAPTURED_PATHS):
+        self.app = app
+        self.log = log
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        chunks = []
+
+        async def receive_and_copy():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        await self.app(scope, receive_and_copy, send)
+        self.log.record(scope["method"], scope["path"], scope.get("query_string", b""), b"".join(chunks))
@@ -0,0 +1,57 @@
+import os
+
+# === Configuration (surchargeable par variables d'environnement) ===
+
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# Cache LRU des embeddings de requêtes (nombre d'entrées)
+EMBED_CACHE_SIZE = _int("EMBED_CACHE_SIZE", 2048)
+
+# Cache des résultats classés: durée de vie (s) et budget mémoire (Mo)
+RESULT_CACHE_TTL = _float("RESULT_CACHE_TTL", 600)
+RESULT_CACHE_MAX_MB = _float("RESULT_CACHE_MAX_MB", 128)
+
+# Micro-batching des encodages: taille max d'un lot et attente max (ms) pour le remplir.
+# BATCH_MAX_SIZE=1 désactive le batching (encode direct dans le thread de la requête).
+BATCH_MAX_SIZE = _int("BATCH_MAX_SIZE", 32)
+BATCH_MAX_WAIT_MS = _float("BATCH_MAX_WAIT_MS", 5)
+
+# Nombre max de textes par appel à POST /api/search
+API_MAX_QUERIES = _int("API_MAX_QUERIES", 256)
+
+# Nombre de listes IVF sondées par requête (0 = valeur enregistrée avec l'index)
+ANN_NPROBE = _int("ANN_NPROBE", 0) or None
+
+# Embeddings quantifiés (build_index.py --quantize): "auto" (int8 puis binary si présents),
+# "int8", "binary" ou "none"; taille de la shortlist re-scorée en float
+QUANT_MODE = os.environ.get("QUANT_MODE", "auto")
+QUANT_SHORTLIST = _int("QUANT_SHORTLIST", 200)
+
+# Encodeur de requêtes: backend CPU ("fp32" ou "int8" = quantification dynamique des
+# couches Linear), threads torch par worker (0 = défaut torch) et longueur max des
+# requêtes en tokens (0 = celle du modèle)
+ENCODER_BACKEND = os.environ.get("ENCODER_BACKEND", "fp32")
+TORCH_THREADS = _int("TORCH_THREADS", 0)
+QUERY_MAX_SEQ_LENGTH = _int("QUERY_MAX_SEQ_LENGTH", 128)
+
+# Journal JSONL des requêtes de recherche, rejoué par benchmarks/load_test.py (vide = pas de capture)
+CAPTURE_REQUESTS = os.environ.get("CAPTURE_REQUESTS", "")
+
+# Profileur par échantillonnage des requêtes lentes: seuil en ms (0 = désactivé),
+# dossier des piles "collapsed" et intervalle d'échantillonnage (ms)
+PROFILE_SLOW_MS = _float("PROFILE_SLOW_MS", 0)
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = _float("PROFILE_INTERVAL_MS", 5)
+
+# Rechargement à chaud des index versionnés (models/<film>/CURRENT): intervalle de
+# surveillance en secondes (0 = seulement via POST /admin/reload, qui n'atteint qu'un worker:
+# gunicorn.conf.py met 10 s par défaut avec plusieurs workers) et jeton de l'endpoint admin
+RELOAD_POLL_S = _float("RELOAD_POLL_S", 0)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
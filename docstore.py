@@ -0,0 +1,64 @@
+import csv
+import os
+import sys
+import numpy as np
+
+# les critiques peuvent dépasser la limite par défaut du module csv (128 Ko)
+csv.field_size_limit(sys.maxsize)
+
+
+# === Stockage compact des critiques ===
+# Un blob UTF-8 + un tableau d'offsets int64 (n+1), tous deux memory-mappés:
+# le texte i est blob[offsets[i]:offsets[i+1]]. Plusieurs workers uvicorn
+# partagent ainsi les mêmes pages du page cache au lieu d'avoir chacun leur DataFrame.
+class DocStore:
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def open(cls, blob_path, offsets_path):
+        offsets = np.load(offsets_path, mmap_mode="r")
+        if os.path.getsize(blob_path) == 0:
+            blob = np.empty(0, dtype=np.uint8)  # np.memmap refuse un fichier vide
+        else:
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        return cls(blob, offsets)
+
+    @classmethod
+    def from_texts(cls, texts):
+        encoded = [t.encode("utf-8") for t in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    @staticmethod
+    def write(texts, blob_file):
+        # écriture en flux du blob (pas tout le corpus encodé en mémoire), renvoie les offsets
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        pos = 0
+        for i, t in enumerate(texts):
+            b = t.encode("utf-8")
+            blob_file.write(b)
+            pos += len(b)
+            offsets[i + 1] = pos
+        return offsets
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def get(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    @property
+    def nbytes(self):
+        return self.blob.nbytes + self.offsets.nbytes
+
+
+def read_clean_csv(path, column="critique"):
+    # lecture en flux du CSV nettoyé, sans pandas
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield row.get(column) or ""
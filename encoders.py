@@ -0,0 +1,27 @@
+import torch
+from sentence_transformers import SentenceTransformer
+
+# === Backends CPU de l'encodeur de requêtes ===
+# fp32: le modèle tel quel. int8: quantification dynamique des couches Linear du
+# transformer (poids int8, activations quantifiées à la volée), ~2-3x plus rapide sur CPU.
+BACKENDS = ("fp32", "int8")
+
+
+def configure_torch_threads(n_threads):
+    # un nombre fixe de threads par worker évite la sur-souscription des cœurs
+    if n_threads and n_threads > 0:
+        torch.set_num_threads(n_threads)
+    return torch.get_num_threads()
+
+
+def load_encoder(model_name, backend="fp32", max_seq_length=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend d'encodeur inconnu: {backend} (attendu: {', '.join(BACKENDS)})")
+    model = SentenceTransformer(model_name, device="cpu")
+    # les requêtes sont courtes: inutile de payer l'attention sur 512 tokens
+    if max_seq_length:
+        model.max_seq_length = min(model.max_seq_length or max_seq_length, max_seq_length)
+    if backend == "int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    model.eval()
+    return model
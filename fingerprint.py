@@ -0,0 +1,33 @@
+import hashlib
+import numpy as np
+
+# === Empreintes de contenu (cache d'embeddings + détection d'index périmé) ===
+
+
+def text_key(model_name, text):
+    # sha1(modèle + texte nettoyé) en hexa, change si l'un ou l'autre change
+    h = hashlib.sha1(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest().encode("ascii")
+
+
+def text_keys(model_name, texts):
+    return np.array([text_key(model_name, t) for t in texts], dtype="S40")
+
+
+def corpus_stats(texts):
+    # (nb de critiques, checksum) en un seul passage sur un itérable (lecture en flux possible);
+    # le checksum dépend du contenu et de l'ordre des critiques (les ids sont des positions)
+    h = hashlib.sha256()
+    n = 0
+    for t in texts:
+        b = t.encode("utf-8")
+        h.update(len(b).to_bytes(8, "little"))
+        h.update(b)
+        n += 1
+    return n, h.hexdigest()
+
+
+def corpus_checksum(texts):
+    return corpus_stats(texts)[1]
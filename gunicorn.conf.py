@@ -0,0 +1,28 @@
+import gc
+import os
+from procinfo import available_cpus, format_memory, limit_native_threads, memory_report, split_threads
+
+# === Déploiement multi-workers: gunicorn -c gunicorn.conf.py app:app ===
+# Le parent charge modèle et index une seule fois puis fork les workers: poids du modèle et
+# tableaux en RAM sont partagés en copy-on-write, les fichiers memory-mappés via le page cache.
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 0)) or available_cpus()
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# threads torch / BLAS répartis entre les workers; ce fichier est lu avant l'import de l'app
+native_threads = limit_native_threads(split_threads(workers))
+
+# POST /admin/reload n'atteint qu'un seul worker: les autres suivent les pointeurs CURRENT
+# par surveillance (valeur par défaut seulement, lue par config à l'import de l'app)
+if workers > 1:
+    os.environ.setdefault("RELOAD_POLL_S", "10")
+
+
+def on_starting(server):
+    # pas de warmup dans le parent: un pool de threads OpenMP hérité au fork bloque les workers
+    import app
+    app.registry.preload(warmup=False)
+    gc.freeze()  # objets du parent hors du GC: ses passages n'écrivent plus dans les pages partagées
+    print(f"[+] Parent {os.getpid()}: index chargés, {workers} workers x {native_threads} threads, {format_memory(memory_report())}")
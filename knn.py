@@ -0,0 +1,42 @@
+import numpy as np
+from search import top_k_rows
+
+
+# === Graphe des K plus proches voisins, précalculé au build ===
+# ids int32 (n, K) et scores float16 (n, K) triés par score décroissant, sans le document
+# lui-même: "plus de critiques comme celle-ci" devient la lecture d'une ligne en O(K),
+# sans appel au modèle ni parcours du corpus. Fichiers .npy memory-mappés au service.
+class KNNGraph:
+    def __init__(self, ids, scores):
+        self.ids = ids
+        self.scores = scores
+        self.n, self.k = ids.shape
+
+    @classmethod
+    def build(cls, X, k=20, max_block_bytes=256 << 20):
+        # produit matriciel exact par blocs de lignes (X L2-normalisé): block x n scores en mémoire à la fois
+        n = X.shape[0]
+        k = max(0, min(k, n - 1))
+        ids = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=np.float16)
+        block = max(1, min(1024, max_block_bytes // max(4 * n, 1)))
+        for start in range(0, n, block):
+            S = X[start:start + block] @ X.T
+            rows = np.arange(S.shape[0])
+            S[rows, start + rows] = -np.inf  # pas soi-même
+            idx, s = top_k_rows(S, k)
+            ids[start:start + block] = idx
+            scores[start:start + block] = s
+        return cls(ids, scores)
+
+    @classmethod
+    def load(cls, ids_path, scores_path):
+        return cls(np.load(ids_path, mmap_mode="r"), np.load(scores_path, mmap_mode="r"))
+
+    def neighbours(self, i, k=None):
+        k = self.k if k is None else min(k, self.k)
+        return np.asarray(self.ids[i, :k], dtype=np.int64), np.asarray(self.scores[i, :k], dtype=np.float32)
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.scores.nbytes
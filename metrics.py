@@ -0,0 +1,213 @@
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Bornes des histogrammes (secondes), de 0.5 ms à 10 s
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Chemins suivis individuellement (les autres sont regroupés sous "other": cardinalité bornée)
+TRACKED_PATHS = ("/", "/api/search", "/ready", "/metrics", "/cache/stats")
+
+# Contexte de la requête en cours: {"stages": {étape: secondes}, "film": ..., "threads": set}
+_request = contextvars.ContextVar("request_timing", default=None)
+
+
+def _escape(value):
+    # échappements du format texte Prometheus pour une valeur de label
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+# === Histogramme Prometheus (compteurs par bucket, thread-safe) ===
+class Histogram:
+    def __init__(self, name, help, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [compteurs par bucket (+Inf en dernier), somme]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in items:
+            base = _labels(self.labelnames, labels)
+            cumulative = 0
+            for le, c in zip(self.buckets + ("+Inf",), counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{{{base},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+def sample(name, help, values, labelnames=(), kind="gauge"):
+    # values: {tuple de labels: valeur}, calculées au moment du scrape (gauge ou counter)
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, v in sorted(values.items()):
+        lines.append(f"{name}{{{_labels(labelnames, labels)}}} {v}" if labelnames else f"{name} {v}")
+    return lines
+
+
+STAGE_SECONDS = Histogram("critiques_stage_seconds", "Durée de chaque étape du chemin de recherche", ("stage", "film"))
+REQUEST_SECONDS = Histogram("critiques_request_seconds", "Durée totale des requêtes HTTP", ("path", "method", "status"))
+
+
+# === Chronométrage des étapes ===
+# Dans une requête, les durées s'additionnent par étape et sont publiées à la fin
+# (histogrammes + en-tête Server-Timing); hors requête, elles vont directement aux histogrammes.
+def record_stage(name, seconds):
+    ctx = _request.get()
+    if ctx is None:
+        STAGE_SECONDS.observe((name, ""), seconds)
+        return
+    ctx["stages"][name] = ctx["stages"].get(name, 0.0) + seconds
+    if ctx["threads"] is not None:
+        ctx["threads"].add(threading.get_ident())  # pour le profileur: threads qui travaillent pour la requête
+
+
+@contextmanager
+def stage(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+
+@contextmanager
+def collect_stages():
+    # durées par étape hors middleware (benchmarks): {étape: secondes}
+    ctx = {"stages": {}, "film": "", "threads": None}
+    token = _request.set(ctx)
+    try:
+        yield ctx["stages"]
+    finally:
+        _request.reset(token)
+
+
+def set_film(film):
+    ctx = _request.get()
+    if ctx is not None:
+        ctx["film"] = film
+
+
+def server_timing(stages, total):
+    parts = [f"{name};dur={seconds * 1000.0:.2f}" for name, seconds in stages.items()]
+    parts.append(f"total;dur={total * 1000.0:.2f}")
+    return ", ".join(parts)
+
+
+# === Profileur par échantillonnage des requêtes lentes (opt-in) ===
+# Un thread relève toutes les interval_ms la pile des threads qui travaillent pour une
+# requête en cours; si la requête dépasse threshold_ms, les piles sont écrites au format
+# "collapsed" (flamegraph.pl, speedscope) dans out_dir.
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms, out_dir="profiles", interval_ms=5.0):
+        self.threshold = threshold_ms / 1000.0
+        self.out_dir = out_dir
+        self.interval = max(interval_ms, 0.5) / 1000.0
+        self._active = {}  # id(ctx) -> ctx
+        self._lock = threading.Lock()
+        self._thread = None
+        self.dumped = 0
+
+    def begin(self, ctx):
+        ctx["threads"] = set()
+        ctx["samples"] = Counter()
+        with self._lock:
+            self._active[id(ctx)] = ctx
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, ctx, total, label):
+        with self._lock:
+            self._active.pop(id(ctx), None)
+        if total >= self.threshold and ctx["samples"]:
+            os.makedirs(self.out_dir, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}_{int(total * 1000)}ms_{label}.txt"
+            with open(os.path.join(self.out_dir, name), "w", encoding="utf-8") as f:
+                for stack, count in ctx["samples"].most_common():
+                    f.write(f"{stack} {count}\n")
+            self.dumped += 1
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            # sous le verrou: end() ne lit les échantillons qu'une fois la requête retirée
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ctx in self._active.values():
+                    for ident in list(ctx["threads"]):
+                        frame = frames.get(ident)
+                        if frame is not None:
+                            ctx["samples"][self._collapse(frame)] += 1
+
+
+# === Middleware ASGI: contexte de chronométrage, Server-Timing, histogrammes ===
+class TimingMiddleware:
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        ctx = {"stages": {}, "film": "", "threads": None}
+        token = _request.set(ctx)
+        if self.profiler is not None:
+            self.profiler.begin(ctx)
+            ctx["threads"].add(threading.get_ident())
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                # l'endpoint a fini son travail quand la réponse démarre
+                header = server_timing(ctx["stages"], time.perf_counter() - t0)
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"server-timing", header.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total = time.perf_counter() - t0
+            _request.reset(token)
+            path = scope["path"] if scope["path"] in TRACKED_PATHS else "other"
+            REQUEST_SECONDS.observe((path, scope["method"], status[0]), total)
+            for name, seconds in ctx["stages"].items():
+                STAGE_SECONDS.observe((name, ctx["film"]), seconds)
+            if self.profiler is not None:
+                self.profiler.end(ctx, total, path.strip("/").replace("/", "_") or "home")
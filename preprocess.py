@@ -2,50 +2,133 @@ import pandas as pd
 #import numpy as np
 import re
 import os
+import glob
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from attributes import META_COLUMNS
+
+# regex compilees une seule fois (et pas a chaque appel de re.sub)
+HTML_TAG = re.compile(r"<.*?>")
+WHITESPACE = re.compile(r"\s+")
 
 def clean_html_and_noise(text) :
     if not isinstance (text, str) :
         return None
-    
+
     # pour enlever les html tags des critiques
-    text= re.sub (r"<.*?>", " " , text)
+    text= HTML_TAG.sub(" " , text)
 
     # replacer multiple whitespace avec une seul
-    text= re.sub (r"\s+", " " , text).strip()
+    text= WHITESPACE.sub(" " , text).strip()
 
     return text
 
-def preprocess(input_path , output_path): # main fct
-    print(f"[+] Loading {input_path}")
-    df= pd.read_csv(input_path, dtype=str, keep_default_na=False, na_values=['']) 
+def clean_batch(texts): # execute dans les process du pool
+    return [clean_html_and_noise(t) for t in texts]
 
+def clean_chunk(df, pool=None, workers=1): # nettoie un chunk et renvoie le DataFrame de sortie
     if "review_content" not in df.columns:
 
         raise ValueError("Column 'review_content' is not found in the CSV entered") #cas ou nous utilisons any other csv with no review_content column
 
     # selectionner review_content column ou ya les critiques et la netoyyer
-    names_series= df["review_content"].replace('', pd.NA).dropna().astype(str)
-    names_series= names_series.map(clean_html_and_noise).dropna().reset_index(drop=True)
+    rows= df[df["review_content"].replace('', pd.NA).notna()]
+    texts= rows["review_content"].astype(str).tolist()
+    if pool is not None and len(texts) > 1:
+        step= -(-len(texts) // workers)
+        parts= pool.map(clean_batch, [texts[i:i + step] for i in range(0, len(texts), step)])
+        cleaned= [t for part in parts for t in part]
+    else:
+        cleaned= clean_batch(texts)
+    out_df= pd.DataFrame({"critique" : pd.Series(cleaned, dtype=object)})
+    # metadonnees (note, date, likes, vues, user_id) gardees sur la meme ligne que la critique
+    for col in META_COLUMNS:
+        if col in rows.columns:
+            out_df[col]= rows[col].to_numpy()
+
+    return out_df.dropna(subset=["critique"]).reset_index(drop=True)
+
+def preprocess(input_path , output_path, chunksize=None, workers=1): # main fct
+    print(f"[+] Loading {input_path}")
+    t0= time.perf_counter()
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    pool= ProcessPoolExecutor(workers) if workers > 1 else None
+
+    try:
+        if chunksize is None: # tout en memoire (petits fichiers)
+            df= pd.read_csv(input_path, dtype=str, keep_default_na=False, na_values=[''])
+            out_df= clean_chunk(df, pool, workers)
+            out_df.to_csv(output_path, index=False)
+            n_in, n_out= len(df), len(out_df)
+        else: # streaming: memoire bornee par chunksize, sortie ecrite au fur et a mesure
+            n_in, n_out= preprocess_streaming(input_path, output_path, chunksize, pool, workers, t0)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed= time.perf_counter() - t0
+    print(f"[+] Saved the cleaned CSV to {output_path} (number of rows is: {n_out})")
+    print(f"[+] {n_in} rows in {elapsed:.2f}s ({n_in / max(elapsed, 1e-9):,.0f} rows/s)")
+    return n_in, n_out
 
-    out_df = pd.DataFrame({"critique" : names_series})
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    out_df.to_csv(output_path, index=False)
+def preprocess_streaming(input_path, output_path, chunksize, pool, workers, t0):
+    header= pd.read_csv(input_path, dtype=str, nrows=0).columns
+    if "review_content" not in header:
+        raise ValueError("Column 'review_content' is not found in the CSV entered")
+    # le parser C de pandas gere les champs multi-lignes entre guillemets a cheval sur deux chunks
+    meta_cols= [c for c in META_COLUMNS if c in header]
+    reader= pd.read_csv(input_path, dtype=str, keep_default_na=False, na_values=[''],
+                        usecols=["review_content"] + meta_cols, chunksize=chunksize)
+    tmp_path= f"{output_path}.tmp"
+    n_in= n_out= 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            for i, chunk in enumerate(reader):
+                out_df= clean_chunk(chunk, pool, workers)
+                out_df.to_csv(f, index=False, header=(i == 0))
+                n_in+= len(chunk)
+                n_out+= len(out_df)
+                elapsed= time.perf_counter() - t0
+                print(f"    chunk {i + 1}: {n_in} rows read, {n_out} kept ({n_in / elapsed:,.0f} rows/s)")
+            if n_in == 0:
+                pd.DataFrame(columns=["critique"] + meta_cols).to_csv(f, index=False)
+        os.replace(tmp_path, output_path) # sortie complete ou rien
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return n_in, n_out
 
-    print(f"[+] Saved the cleaned CSV to {output_path} (number of rows is: {len(out_df)})")
+def expand_inputs(patterns): # --input accepte des globs et plusieurs fichiers
+    paths= []
+    for p in patterns:
+        matches= sorted(glob.glob(p))
+        paths.extend(matches if matches else [p])
+    return paths
+
+def default_output(input_path):
+    base= os.path.splitext(os.path.basename(input_path))[0]
+    return f"data/{base}_clean.csv"
 
 if __name__ == "__main__":
     files= argparse.ArgumentParser()
-    files.add_argument("--input" , required=True ) # entrer le csv input, example fightclub_critiques.csv
-    files.add_argument("--output" , default=None ) # sortie du csv clean, example fightclub_clean.csv
-    
+    files.add_argument("--input" , required=True, nargs="+" ) # entrer le(s) csv input ou un glob, example fightclub_critiques.csv ou "*_critiques.csv"
+    files.add_argument("--output" , default=None ) # sortie du csv clean, example fightclub_clean.csv (un seul input)
+    files.add_argument("--chunksize" , type=int, default=None ) # mode streaming: nb de lignes lues par chunk
+    files.add_argument("--workers" , type=int, default=os.cpu_count() or 1 ) # nb de process pour le nettoyage
+
     args= files.parse_args()
-    input_path= args.input
-    if args.output :
-        output_path= args.output
+    inputs= expand_inputs(args.input)
+    if args.output and len(inputs) > 1:
+        files.error("--output ne peut etre utilise qu'avec un seul fichier d'entree")
 
-    else:
-        base= os.path.splitext(os.path.basename(input_path))[0]
-        output_path= f"data/{base}_clean.csv"
-    #main appel
-    preprocess(input_path, output_path)
+    t0= time.perf_counter()
+    total= 0
+    for input_path in inputs:
+        output_path= args.output if args.output else default_output(input_path)
+        #main appel
+        n_in, _= preprocess(input_path, output_path, args.chunksize, args.workers)
+        total+= n_in
+    if len(inputs) > 1:
+        elapsed= time.perf_counter() - t0
+        print(f"[+] {len(inputs)} files, {total} rows in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
@@ -0,0 +1,55 @@
+import os
+
+# Variables lues au chargement des bibliothèques natives (OpenMP, BLAS): à fixer avant l'import de numpy / torch
+NATIVE_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+# === Cœurs et threads par worker ===
+def available_cpus():
+    # cœurs réellement attribués au process (cpuset d'un conteneur), pas ceux de la machine
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def split_threads(workers, cpus=None):
+    # N workers x T threads <= cœurs: pas de sur-souscription, au moins un thread chacun
+    cpus = cpus or available_cpus()
+    return max(1, cpus // max(1, workers))
+
+
+def limit_native_threads(n_threads):
+    # valeurs par défaut seulement: une variable déjà définie par l'utilisateur est conservée
+    for name in NATIVE_THREAD_VARS + ("TORCH_THREADS",):
+        os.environ.setdefault(name, str(n_threads))
+    return n_threads
+
+
+# === Mémoire du process: pages propres au worker vs pages partagées (Linux) ===
+# /proc/self/smaps_rollup: Private_* = mémoire que le worker est seul à utiliser,
+# Shared_* = pages communes (héritées du parent au fork, fichiers memory-mappés),
+# Pss = part proportionnelle (somme sur les workers = mémoire réelle du nœud).
+def memory_report(path="/proc/self/smaps_rollup"):
+    try:
+        with open(path) as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return None  # hors Linux (ou noyau < 4.14)
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "unique": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+def format_memory(report):
+    if report is None:
+        return "mémoire non disponible"
+    mb = {k: v / (1024 * 1024) for k, v in report.items()}
+    return f"unique {mb['unique']:.0f} Mo, partagée {mb['shared']:.0f} Mo (RSS {mb['rss']:.0f} Mo, PSS {mb['pss']:.0f} Mo)"
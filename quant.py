@@ -0,0 +1,102 @@
+import numpy as np
+
+# popcount sur 16 bits par table (np.bitwise_count n'existe qu'à partir de numpy 2.0)
+POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+HAS_BITWISE_COUNT = hasattr(np, "bitwise_count")
+
+
+def pack_bits(B):
+    # 8 dimensions par octet, complété à un multiple de 8 octets (mots de 64 bits)
+    packed = np.packbits(B, axis=-1)
+    pad = (-packed.shape[-1]) % 8
+    if pad:
+        packed = np.concatenate([packed, np.zeros(packed.shape[:-1] + (pad,), dtype=np.uint8)], axis=-1)
+    return np.ascontiguousarray(packed)
+
+
+def hamming(bits, qbits):
+    if HAS_BITWISE_COUNT:
+        return np.bitwise_count(bits.view(np.uint64) ^ qbits.view(np.uint64)).sum(axis=-1, dtype=np.int32)
+    return POPCOUNT16[bits.view(np.uint16) ^ qbits.view(np.uint16)].sum(axis=-1, dtype=np.int32)
+
+
+# === Quantification scalaire int8 ===
+# Une échelle par dimension (calibrée sur le corpus): x ~= scale * code, code dans [-127, 127].
+# 4x moins de mémoire que float32; le score approché est (q * scale) . code.
+class Int8Matrix:
+    kind = "int8"
+
+    def __init__(self, codes, scale):
+        self.codes = codes
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.n, self.dim = codes.shape
+
+    @classmethod
+    def build(cls, X):
+        X = np.asarray(X, dtype=np.float32)
+        scale = np.abs(X).max(axis=0) / 127.0 if X.shape[0] else np.ones(X.shape[1], dtype=np.float32)
+        scale[scale == 0] = 1.0
+        codes = np.clip(np.rint(X / scale), -127, 127).astype(np.int8)
+        return cls(codes, scale.astype(np.float32))
+
+    def save(self, f):
+        np.savez(f, kind=np.array(self.kind), codes=self.codes, scale=self.scale)
+
+    def scores(self, q, block=1024):
+        # par petits blocs (tiennent en cache): le passage en float32 ne matérialise jamais toute la matrice
+        qs = (np.asarray(q, dtype=np.float32) * self.scale).astype(np.float32)
+        out = np.empty(self.n, dtype=np.float32)
+        for start in range(0, self.n, block):
+            out[start:start + block] = self.codes[start:start + block].astype(np.float32) @ qs
+        return out
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scale.nbytes
+
+
+# === Quantification binaire (1 bit par dimension) ===
+# bit = x > seuil (seuil = moyenne de la dimension sur le corpus), 64 dimensions par mot.
+# 32x moins de mémoire que float32; score approché = -distance de Hamming (popcount du XOR).
+class BinaryMatrix:
+    kind = "binary"
+
+    def __init__(self, bits, thresholds):
+        self.bits = bits
+        self.thresholds = np.asarray(thresholds, dtype=np.float32)
+        self.n = bits.shape[0]
+        self.dim = self.thresholds.shape[0]
+
+    @classmethod
+    def build(cls, X):
+        X = np.asarray(X, dtype=np.float32)
+        thresholds = X.mean(axis=0) if X.shape[0] else np.zeros(X.shape[1], dtype=np.float32)
+        return cls(pack_bits(X > thresholds), thresholds.astype(np.float32))
+
+    def save(self, f):
+        np.savez(f, kind=np.array(self.kind), bits=self.bits, thresholds=self.thresholds)
+
+    def scores(self, q, block=8192):
+        qbits = pack_bits(np.asarray(q, dtype=np.float32) > self.thresholds)
+        out = np.empty(self.n, dtype=np.float32)
+        for start in range(0, self.n, block):
+            out[start:start + block] = -hamming(self.bits[start:start + block], qbits)
+        return out
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes + self.thresholds.nbytes
+
+
+QUANTIZERS = {"int8": Int8Matrix, "binary": BinaryMatrix}
+
+
+def load_quantized(path):
+    with np.load(path) as z:
+        kind = str(z["kind"])
+        if kind == "int8":
+            return Int8Matrix(z["codes"], z["scale"])
+        if kind == "binary":
+            return BinaryMatrix(z["bits"], z["thresholds"])
+    raise ValueError(f"Quantification inconnue: {kind}")
+
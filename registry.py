@@ -0,0 +1,348 @@
+import glob
+import os
+import threading
+from collections import Counter
+import joblib
+import numpy as np
+import pandas as pd
+import config
+from ann import IVFIndex
+from attributes import ReviewAttributes
+from docstore import DocStore, read_clean_csv
+from encoders import configure_torch_threads, load_encoder
+from fingerprint import corpus_stats
+from knn import KNNGraph
+from quant import load_quantized
+from search import GlobalIndex, SearchIndex
+
+MODEL_DIR = "models"
+CURRENT = "CURRENT"  # models/<film>/CURRENT: nom de la version servie
+
+
+# Raisons pour lesquelles l'index ne correspond plus au CSV nettoyé (liste vide = à jour).
+# Les meta construites avant l'ajout du checksum ne permettent qu'une vérification partielle.
+def stale_reasons(meta, model_name, X, n_texts, checksum):
+    reasons = []
+    if meta.get("model_name", model_name) != model_name:
+        reasons.append(f"modèle {meta['model_name']} != {model_name}")
+    if "dim" in meta and X.ndim == 2 and meta["dim"] != X.shape[1]:
+        reasons.append(f"dimension {meta['dim']} != {X.shape[1]}")
+    # index dédoublonné: moins d'embeddings que de lignes, n_rows = lignes du CSV au build
+    if meta.get("n_rows", X.shape[0]) != n_texts or meta.get("n_docs", X.shape[0]) != X.shape[0]:
+        reasons.append(f"{X.shape[0]} embeddings pour {n_texts} critiques")
+    if "checksum" in meta and meta["checksum"] != checksum:
+        reasons.append("contenu du CSV modifié depuis le build")
+    return reasons
+
+
+# === Registre des modèles et index ===
+# Un seul SentenceTransformer par nom de modèle et par process: les films qui
+# partagent le même encodeur (cas de interstellar / fightclub) partagent aussi les poids.
+# Le backend (fp32 / int8) et la longueur max des requêtes viennent de config.py.
+# Les films sont découverts dans model_dir (un <film>_encoder.joblib + <film>_meta.joblib
+# par film), pas déclarés dans le code. Index versionnés (models/<film>/<version>/ +
+# pointeur CURRENT): reload() ouvre les nouvelles versions hors verrou puis les échange
+# d'un bloc; les requêtes en cours finissent sur l'entrée (et les fichiers) de l'ancienne.
+class ModelRegistry:
+    def __init__(self, model_dir=MODEL_DIR, films=None, backend=None, max_seq_length=None):
+        self.films = dict(films or {})  # film -> {"clean_csv", "title", "dir", "version"}
+        self.model_dir = model_dir
+        self.backend = backend or config.ENCODER_BACKEND
+        self.max_seq_length = max_seq_length or config.QUERY_MAX_SEQ_LENGTH
+        self._encoders = {}  # model_name -> SentenceTransformer
+        self._loaded = {}  # film -> {"encoder", "model_name", "X", "index", "meta", "docs", "attrs", "knn", "copies", "stale", "version", "generation"}
+        self._errors = {}  # film -> message si le chargement a échoué
+        self._lock = threading.RLock()
+        self._global = None  # GlobalIndex, reconstruit quand la liste des films chargés change
+        self._generation = 0
+        self._reload_lock = threading.Lock()
+        self.preloaded = False
+        self.torch_threads = None
+
+    def path(self, film, suffix, info=None):
+        # fichiers de la version donnée (info), par défaut celle connue du registre
+        info = info or self.films.get(film, {})
+        return os.path.join(info.get("dir") or self.model_dir, f"{film}_{suffix}")
+
+    def current_version(self, film):
+        try:
+            with open(os.path.join(self.model_dir, film, CURRENT)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _info(self, film, directory, version):
+        meta_path = os.path.join(directory, f"{film}_meta.joblib")
+        meta = joblib.load(meta_path) if os.path.exists(meta_path) else {}
+        return {
+            "clean_csv": meta.get("csv"),
+            "title": meta.get("title") or film.replace("_", " ").title(),
+            "dir": directory,
+            "version": version,
+        }
+
+    def discover(self):
+        # un film = un manifest <film>_encoder.joblib (+ meta) dans model_dir (ancien format à plat),
+        # ou un dossier models/<film>/ avec un pointeur CURRENT (prioritaire)
+        found = {}
+        suffix = "_encoder.joblib"
+        for path in sorted(glob.glob(os.path.join(self.model_dir, f"*{suffix}"))):
+            film = os.path.basename(path)[:-len(suffix)]
+            found[film] = self._info(film, self.model_dir, None)
+        for pointer in sorted(glob.glob(os.path.join(self.model_dir, "*", CURRENT))):
+            film = os.path.basename(os.path.dirname(pointer))
+            version = self.current_version(film)
+            if version and os.path.isdir(os.path.join(self.model_dir, film, version)):
+                found[film] = self._info(film, os.path.join(self.model_dir, film, version), version)
+        with self._lock:
+            for film, info in found.items():
+                self.films.setdefault(film, info)
+        return found
+
+    def titles(self):
+        return {film: info.get("title") or film for film, info in self.films.items()}
+
+    def encoder(self, model_name):
+        enc = self._encoders.get(model_name)
+        if enc is None:
+            with self._lock:
+                enc = self._encoders.get(model_name)
+                if enc is None:
+                    print(f"[+] Loading embedding model: {model_name} ({self.backend})")
+                    enc = load_encoder(model_name, self.backend, self.max_seq_length)
+                    self._encoders[model_name] = enc
+        return enc
+
+    def load(self, film):
+        # films connus seulement: un film ajouté dans models/ depuis le démarrage est découvert par
+        # reload() (POST /admin/reload ou RELOAD_POLL_S), pas à chaque requête sur un nom inconnu
+        if film not in self.films:
+            raise KeyError(film)
+        entry = self._loaded.get(film)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            entry = self._loaded.get(film)
+            if entry is not None:
+                return entry
+            try:
+                entry = self._open(film, self.films[film])
+            except FileNotFoundError as e:
+                self._errors[film] = str(e)
+                raise
+            self._loaded[film] = entry
+            self._errors.pop(film, None)
+            self._global = None
+            return entry
+
+    def _open(self, film, info):
+        vec_path = self.path(film, "encoder.joblib", info)
+        X_path = self.path(film, "X.npy", info)
+        meta_path = self.path(film, "meta.joblib", info)
+        if not os.path.exists(vec_path) or not os.path.exists(X_path):
+            raise FileNotFoundError(f"Modèle pour '{film}' absent. Lancez build_index.py.")
+
+        model_name = joblib.load(vec_path)
+        # embeddings et critiques memory-mappés: pages partagées entre workers
+        X = np.load(X_path, mmap_mode="r")
+        meta = joblib.load(meta_path) if os.path.exists(meta_path) else {}
+        docs = self.open_docs(film, info)
+
+        clean_csv = info.get("clean_csv")
+        stale = []
+        if clean_csv and os.path.exists(clean_csv):
+            n_texts, checksum = corpus_stats(read_clean_csv(clean_csv))
+            stale = stale_reasons(meta, model_name, X, n_texts, checksum)
+        if stale:
+            print(f"[!] Index de '{film}' périmé ({'; '.join(stale)}). Relancez build_index.py --incremental.")
+        # index ANN optionnel (build_index.py --ann ivf), sinon recherche exacte
+        ivf_path = self.path(film, "ivf.npz", info)
+        ann = IVFIndex.load(ivf_path) if os.path.exists(ivf_path) else None
+        quant = self.open_quantized(film, info)
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        return {
+            "model_name": model_name,
+            "encoder": self.encoder(model_name),
+            "X": X,
+            "index": SearchIndex(X, ann=ann, nprobe=config.ANN_NPROBE, normalized=meta.get("normalized", False),
+                                 quant=quant, shortlist=config.QUANT_SHORTLIST),
+            "meta": meta,
+            "stale": stale,
+            "docs": docs,
+            "attrs": self.open_attrs(film, X.shape[0], info),
+            "knn": self.open_knn(film, info),
+            "copies": self.open_copies(film, info),
+            "version": info.get("version"),
+            "generation": generation,  # change à chaque chargement: clé des caches de résultats
+        }
+
+    def reload(self):
+        # versions publiées depuis le chargement (et nouveaux films): ouvertes sans bloquer
+        # les requêtes, puis échangées film par film; renvoie {film: nouvelle version}
+        swapped = {}
+        with self._reload_lock:
+            for film, info in self.discover().items():
+                old = self._loaded.get(film)
+                if old is not None and old["version"] == info["version"]:
+                    continue
+                if old is None and film in self._errors and self.films[film].get("version") == info["version"]:
+                    continue  # même version déjà en échec
+                try:
+                    entry = self._open(film, info)
+                except (OSError, ValueError, KeyError) as e:
+                    self._errors[film] = f"version {info['version']}: {e}"
+                    print(f"[!] Rechargement de '{film}' impossible: {e}")
+                    continue
+                with self._lock:
+                    self.films[film] = info
+                    self._loaded[film] = entry
+                    self._errors.pop(film, None)
+                    self._global = None
+                swapped[film] = info["version"]
+                print(f"[+] '{film}' -> version {info['version']}")
+            if swapped:
+                self.warmup()
+                self.global_index()
+        return swapped
+
+    def global_index(self):
+        # index multi-films pour l'encodeur le plus utilisé (on ne mélange pas deux espaces d'embeddings);
+        # les embeddings restent les memmaps de chaque film, seules les métadonnées sont concaténées
+        gi = self._global
+        if gi is not None:
+            return gi
+        with self._lock:
+            if self._global is not None:
+                return self._global
+            loaded = {f: e for f, e in self._loaded.items()}
+            if not loaded:
+                raise FileNotFoundError("Aucun film chargé. Lancez build_index.py.")
+            model_name = Counter(e["model_name"] for e in loaded.values()).most_common(1)[0][0]
+            films = [f for f in sorted(loaded) if loaded[f]["model_name"] == model_name]
+            # une seule largeur d'embeddings: un index incohérent (dimension différente) n'est pas mélangé aux autres
+            dim = Counter(loaded[f]["index"].X.shape[1] for f in films).most_common(1)[0][0]
+            for f in [f for f in films if loaded[f]["index"].X.shape[1] != dim]:
+                print(f"[!] {f}: dimension {loaded[f]['index'].X.shape[1]} != {dim}, exclu de l'index multi-films")
+            films = [f for f in films if loaded[f]["index"].X.shape[1] == dim]
+            self._generation += 1
+            gi = GlobalIndex(films, [loaded[f]["index"].X for f in films], self._generation)
+            gi.attrs = ReviewAttributes.concat([loaded[f]["attrs"] for f in films])
+            for i, f in enumerate(films):
+                loaded[f]["attrs"] = gi.attrs.slice(gi.offsets[i], gi.offsets[i + 1])
+            gi.model_name = model_name
+            gi.encoder = self.encoder(model_name)
+            gi.entries = {f: loaded[f] for f in films}  # entrées de cette génération (textes, métadonnées)
+            self._global = gi
+            return gi
+
+    def open_quantized(self, film, info=None):
+        # embeddings quantifiés optionnels (build_index.py --quantize), choisis par QUANT_MODE
+        modes = ["int8", "binary"] if config.QUANT_MODE == "auto" else [config.QUANT_MODE]
+        for mode in modes:
+            path = self.path(film, f"{mode}.npz", info)
+            if mode in ("int8", "binary") and os.path.exists(path):
+                return load_quantized(path)
+        return None
+
+    def open_knn(self, film, info=None):
+        # graphe des voisins optionnel (build_index.py --knn), sinon /similar parcourt l'index
+        ids_path = self.path(film, "knn_ids.npy", info)
+        scores_path = self.path(film, "knn_scores.npy", info)
+        if os.path.exists(ids_path) and os.path.exists(scores_path):
+            return KNNGraph.load(ids_path, scores_path)
+        return None
+
+    def open_copies(self, film, info=None):
+        # taille du groupe de doublons de chaque critique (build_index.py --dedup), sinon None
+        path = self.path(film, "copies.npy", info)
+        return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+    def open_attrs(self, film, n, info=None):
+        path = self.path(film, "attrs.npz", info)
+        if os.path.exists(path):
+            return ReviewAttributes.load(path)
+        # index construit avant les métadonnées: relues depuis le CSV nettoyé s'il les contient
+        clean_csv = (info or self.films[film]).get("clean_csv")
+        if clean_csv and os.path.exists(clean_csv):
+            df = pd.read_csv(clean_csv, dtype=str, keep_default_na=False)
+            if len(df) == n:
+                return ReviewAttributes.from_frame(df)
+        return ReviewAttributes.empty(n)
+
+    def open_docs(self, film, info=None):
+        blob_path = self.path(film, "docs.bin", info)
+        offsets_path = self.path(film, "offsets.npy", info)
+        if os.path.exists(blob_path) and os.path.exists(offsets_path):
+            return DocStore.open(blob_path, offsets_path)
+        # index construit avant le docstore: critiques relues depuis le CSV nettoyé
+        return DocStore.from_texts(list(read_clean_csv((info or self.films[film])["clean_csv"])))
+
+    def warmup(self):
+        # un premier encode paie l'initialisation paresseuse de torch (threads, kernels)
+        for enc in list(self._encoders.values()):
+            enc.encode(["warmup"], convert_to_numpy=True)
+
+    def preload(self, warmup=True):
+        # multi-workers (gunicorn.conf.py): le parent charge sans warmup avant le fork, chaque
+        # worker hérite des index et ne fait que fixer ses threads torch et se préchauffer
+        self.torch_threads = configure_torch_threads(config.TORCH_THREADS)
+        if not self.preloaded:
+            self.discover()
+            for film in list(self.films):
+                try:
+                    self.load(film)
+                except FileNotFoundError as e:
+                    print(f"[!] {e}")
+            if self._loaded:
+                self.global_index()
+        if warmup:
+            self.warmup()
+        self.preloaded = True
+
+    def memory(self):
+        # octets des index chargés par film et par composant (les tableaux memory-mappés comptent leur taille mappée)
+        out = {}
+        for film, entry in list(self._loaded.items()):
+            index = entry["index"]
+            out[film] = {"embeddings": int(entry["X"].nbytes), "docs": int(entry["docs"].nbytes),
+                         "attrs": int(entry["attrs"].nbytes)}
+            if index.quant is not None:
+                out[film]["quant"] = int(index.quant.nbytes)
+            if entry["knn"] is not None:
+                out[film]["knn"] = int(entry["knn"].nbytes)
+            if entry["copies"] is not None:
+                out[film]["copies"] = int(entry["copies"].nbytes)
+            if index.ann is not None:
+                out[film]["ann"] = int(index.ann.centroids.nbytes + index.ann.list_ids.nbytes + index.ann.list_offsets.nbytes)
+        return out
+
+    def status(self):
+        films = {}
+        for film in list(self.films):
+            entry = self._loaded.get(film)
+            info = {"title": self.films[film].get("title"), "loaded": entry is not None,
+                    "version": entry["version"] if entry is not None else self.films[film].get("version")}
+            if entry is not None:
+                info["model"] = entry["model_name"]
+                info["n_docs"] = int(entry["X"].shape[0])
+                info["stale"] = entry["stale"] or False
+                info["metadata"] = entry["attrs"].has_metadata
+                info["knn"] = entry["knn"].k if entry["knn"] is not None else None
+                info["dedup"] = entry["meta"].get("dedup")
+                ann = entry["index"].ann
+                info["ann"] = {"type": "ivf", "nlist": ann.nlist, "nprobe": entry["index"].nprobe or ann.nprobe} if ann else None
+                quant = entry["index"].quant
+                info["quant"] = {"type": quant.kind, "bytes": int(quant.nbytes), "shortlist": entry["index"].shortlist} if quant else None
+            if film in self._errors:
+                info["error"] = self._errors[film]
+            films[film] = info
+        return {
+            "ready": self.preloaded and any(f["loaded"] for f in films.values()),
+            "encoders": sorted(self._encoders),
+            "backend": self.backend,
+            "films": films,
+            "global": {"films": self._global.films, "n_docs": int(self._global.index.n)} if self._global else None,
+        }
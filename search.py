@@ -0,0 +1,249 @@
+import numpy as np
+
+
+def l2_normalize(X, eps=1e-12):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=-1, keepdims=True)
+    return X / np.maximum(norms, eps)
+
+
+def top_k(scores, k):
+    # argpartition en O(n) puis tri des k gagnants seulement
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return idx, scores[idx]
+
+
+# Même chose ligne par ligne pour une matrice de scores (n_requêtes, n_docs)
+def top_k_rows(S, k):
+    nq, n = S.shape
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((nq, 0), dtype=np.int64), np.empty((nq, 0), dtype=S.dtype)
+    if k < n:
+        part = np.argpartition(-S, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(n), (nq, 1))
+    part_scores = np.take_along_axis(S, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+def dot_rows(X, Q, ids=None):
+    # similarités restreintes aux lignes ids; filtre peu sélectif: produit complet puis sélection
+    if ids is None:
+        return Q @ X.T
+    if ids.shape[0] * 4 < X.shape[0]:
+        return Q @ X[ids].T
+    return (Q @ X.T)[..., ids]
+
+
+# Résultats classés d'une requête: le préfixe trié est étendu à la demande
+# (k doublé) quand on pagine plus loin que ce qui a déjà été trié.
+# ids: identifiants des documents scorés quand on n'a scoré qu'un sous-ensemble (ANN, shortlist).
+# n: nombre de résultats atteignables en paginant; s'il dépasse les candidats scorés,
+# expand(k) -> (ids, scores) re-score une shortlist d'au moins k candidats.
+class RankedResults:
+    def __init__(self, scores, initial_k=50, ids=None, n=None, expand=None):
+        self.n = scores.shape[0] if n is None else n
+        self._expand = expand
+        # (scores, ids, k, idx) remplacé d'un bloc: lecture sûre depuis plusieurs threads
+        self._state = (scores, ids, 0, np.empty(0, dtype=np.int64))
+        self._initial_k = initial_k
+
+    @property
+    def nbytes(self):
+        # borne haute: scores + préfixe trié complet (+ ids) pour les n résultats atteignables
+        scores, ids = self._state[:2]
+        per_doc = scores.dtype.itemsize + np.dtype(np.int64).itemsize + (ids.dtype.itemsize if ids is not None else 0)
+        return self.n * per_doc
+
+    def ensure(self, k):
+        k = min(k, self.n)
+        scores, ids, cur_k, idx = self._state
+        if k > cur_k:
+            k = min(max(k, 2 * cur_k, self._initial_k), self.n)
+            if k > scores.shape[0] and self._expand is not None:
+                # shortlist agrandie (ids triés, sur-ensemble de l'ancienne): les pages déjà
+                # servies gardent leur ordre, les nouveaux candidats sont classés à la suite
+                served = ids[idx]
+                ids, scores = self._expand(k)
+                pos = np.searchsorted(ids, served)
+                rest = scores.copy()
+                rest[pos] = -np.inf
+                more, _ = top_k(rest, k - cur_k)
+                idx = np.concatenate([pos, more])
+            else:
+                idx, _ = top_k(scores, k)
+            self._state = (scores, ids, k, idx)
+        return self._state
+
+    def window(self, start, end):
+        end = min(end, self.n)
+        if start >= end:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=self._state[0].dtype)
+        scores, ids, _, idx = self.ensure(end)
+        idx = idx[start:end]
+        return (idx if ids is None else ids[idx]), scores[idx]
+
+
+# Index de recherche: matrice L2-normalisée une seule fois (float32), le cosinus
+# devient un simple produit matrice-vecteur. Avec un index ANN (ann.IVFIndex), seuls
+# les candidats des listes sondées sont scorés; avec une matrice quantifiée
+# (quant.Int8Matrix / BinaryMatrix), un premier passage sur les codes donne une
+# shortlist re-scorée exactement sur les vecteurs float; sans, recherche exacte.
+# normalized=True: X est déjà L2-normalisé en float32 (build_index.py), il est utilisé
+# tel quel, sans copie (un np.memmap reste partagé entre workers).
+# mask (booléen par document) restreint la recherche avant le top-k; weights (float32
+# par document) multiplie la similarité (mélange avec la popularité).
+class SearchIndex:
+    def __init__(self, X, ann=None, nprobe=None, normalized=False, quant=None, shortlist=200):
+        if normalized and X.dtype == np.float32 and X.flags.c_contiguous:
+            self.X = X
+        else:
+            self.X = np.ascontiguousarray(l2_normalize(X))
+        self.n, self.dim = self.X.shape
+        self.ann = ann
+        self.nprobe = nprobe
+        self.quant = quant if ann is None else None
+        self.shortlist = shortlist
+
+    @property
+    def approximate(self):
+        return self.ann is not None or self.quant is not None
+
+    def _query(self, qvec):
+        return l2_normalize(np.asarray(qvec, dtype=np.float32).reshape(-1))
+
+    def scores(self, qvec):
+        return self._dot(self._query(qvec))
+
+    def scores_batch(self, Q):
+        # un seul produit matrice-matrice pour toutes les requêtes
+        Q = l2_normalize(np.asarray(Q, dtype=np.float32).reshape(-1, self.dim))
+        return self._dot(Q)
+
+    def _candidates(self, q, k=0, mask=None):
+        if self.ann is not None:
+            ids = self.ann.candidates(q, self.nprobe)
+            if mask is not None:
+                ids = ids[mask[ids]]
+        else:
+            qs = self.quant.scores(q)
+            if mask is not None:
+                qs[~mask] = -np.inf  # la shortlist ne contient que des documents autorisés
+            ids, qs = top_k(qs, max(self.shortlist, k))
+            ids = ids[np.isfinite(qs)]
+            ids.sort()  # lecture des vecteurs float dans l'ordre du fichier
+        # re-scoring exact des candidats
+        return ids, self.X[ids] @ q
+
+    def _n_candidates(self, k=0):
+        # nombre de vecteurs float re-scorés par le chemin approché
+        if self.ann is not None:
+            return self.n * min(self.nprobe or self.ann.nprobe, self.ann.nlist) // max(self.ann.nlist, 1)
+        return max(self.shortlist, k)
+
+    def _dot(self, Q, ids=None):
+        return dot_rows(self.X, Q, ids)
+
+    def _filtered(self, q, k=0, mask=None, weights=None):
+        # (ids, scores) à classer; ids=None: tous les documents dans l'ordre
+        if mask is None:
+            ids, s = self._candidates(q, k) if self.approximate else (None, self._dot(q))
+        else:
+            allowed = np.flatnonzero(mask)
+            # filtre sélectif (moins de documents autorisés que de candidats approchés): exact sur le sous-ensemble
+            if not self.approximate or allowed.shape[0] <= self._n_candidates(k):
+                ids, s = allowed, self._dot(q, allowed)
+            else:
+                ids, s = self._candidates(q, k, mask)
+        if weights is not None:
+            s = s * (weights if ids is None else weights[ids])
+        return ids, s
+
+    def search_batch(self, Q, k, mask=None, weights=None):
+        if not self.approximate:
+            Q = l2_normalize(np.asarray(Q, dtype=np.float32).reshape(-1, self.dim))
+            ids = np.flatnonzero(mask) if mask is not None else None
+            S = self._dot(Q, ids)
+            if weights is not None:
+                S *= weights if ids is None else weights[ids]
+            idx, s = top_k_rows(S, k)
+            return (idx if ids is None else ids[idx]), s
+        # ANN / quantifié: nombre de candidats variable par requête -> listes de tableaux
+        idxs, scores = [], []
+        for q in np.asarray(Q, dtype=np.float32).reshape(-1, self.dim):
+            i, s = self.search(q, k, mask, weights)
+            idxs.append(i)
+            scores.append(s)
+        return idxs, scores
+
+    def search(self, qvec, k, mask=None, weights=None):
+        ids, s = self._filtered(self._query(qvec), k, mask, weights)
+        local, s = top_k(s, k)
+        return (local if ids is None else ids[local]), s
+
+    def rank(self, qvec, initial_k=50, mask=None, weights=None):
+        q = self._query(qvec)
+        ids, s = self._filtered(q, 0, mask, weights)
+        if self.quant is not None and ids is not None:
+            n = self.n if mask is None else int(np.count_nonzero(mask))
+            if ids.shape[0] < n:
+                # shortlist quantifiée: agrandie (et re-scorée) quand on pagine au-delà, tous les documents restent atteignables
+                return RankedResults(s, initial_k=initial_k, ids=ids, n=n,
+                                     expand=lambda k: self._filtered(q, k, mask, weights))
+        return RankedResults(s, initial_k=initial_k, ids=ids)
+
+
+# Plusieurs matrices (une par film) vues comme un seul index exact: id global = offset du
+# film + id local. Chaque produit est fait sur la matrice du film (np.memmap partagé entre
+# workers, pas de copie); seuls les scores (n float32 par requête) sont concaténés.
+class ConcatIndex(SearchIndex):
+    def __init__(self, matrices, offsets):
+        self.parts = list(matrices)
+        self.offsets = offsets
+        self.n = int(offsets[-1])
+        self.dim = self.parts[0].shape[1] if self.parts else 0
+        self.ann = None
+        self.nprobe = None
+        self.quant = None
+        self.shortlist = 0
+
+    def _dot(self, Q, ids=None):
+        if ids is None:
+            out = [dot_rows(X, Q) for X in self.parts]
+        else:
+            # ids triés (np.flatnonzero): une tranche contiguë par film
+            cuts = np.searchsorted(ids, self.offsets)
+            out = [dot_rows(X, Q, ids[cuts[i]:cuts[i + 1]] - self.offsets[i]) for i, X in enumerate(self.parts)]
+        if not out:
+            return np.empty(Q.shape[:-1] + (0,), dtype=np.float32)
+        return np.concatenate(out, axis=-1)
+
+
+# Index global: embeddings de tous les films (d'un même encodeur), avec l'id du film de
+# chaque ligne. Les ids d'un film sont contigus: la recherche multi-films classe tous les
+# documents d'un coup, sans copier les embeddings (ConcatIndex).
+class GlobalIndex:
+    def __init__(self, films, matrices, generation=0):
+        self.films = list(films)
+        sizes = [m.shape[0] for m in matrices]
+        self.offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.offsets[1:])
+        self.film_ids = np.repeat(np.arange(len(self.films), dtype=np.int32), sizes)
+        self.index = ConcatIndex(matrices, self.offsets)
+        self.generation = generation
+
+    def locate(self, gids):
+        # ids globaux -> (film, id local dans le film)
+        gids = np.asarray(gids, dtype=np.int64)
+        f = self.film_ids[gids]
+        return [self.films[i] for i in f], gids - self.offsets[f]